@@ -0,0 +1,214 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from browser_launcher import ChromeLauncher
+from browser_session import CalendarPagePool
+import tracing
+
+DEFAULT_ACCOUNT = "default"
+# 用作配置目录名，所以不能以 "." 开头
+ACCOUNT_ID_RE = re.compile(r"^[A-Za-z0-9_@-][A-Za-z0-9_.@-]{0,63}$")
+
+
+class AccountLimitError(RuntimeError):
+    """Every account slot is busy, so no browser can be started for a new one."""
+
+
+class _Account:
+    def __init__(self, account_id, pool, launcher=None):
+        self.id = account_id
+        self.pool = pool
+        self.launcher = launcher
+        self.active = 0
+        self.last_used = time.monotonic()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    @property
+    def evictable(self):
+        # The default account's browsers belong to the caller
+        return self.launcher is not None
+
+    @contextmanager
+    def locked(self, keys):
+        """Hold one lock per key (in sorted order, so overlapping key sets cannot deadlock)."""
+        keys = sorted(set(keys))
+        with self._locks_guard:
+            entries = []
+            for key in keys:
+                entry = self._locks.setdefault(key, [threading.Lock(), 0])
+                entry[1] += 1
+                entries.append((key, entry))
+        held = []
+        try:
+            for _, entry in entries:
+                entry[0].acquire()
+                held.append(entry)
+            yield
+        finally:
+            for entry in reversed(held):
+                entry[0].release()
+            with self._locks_guard:
+                for key, entry in entries:
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        del self._locks[key]
+
+    def stats(self):
+        info = {
+            "active": self.active,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+            "pool": self.pool.stats(),
+        }
+        if self.launcher is not None:
+            info["port"] = self.launcher.port
+            info["profile_dir"] = self.launcher.user_data_dir
+        return info
+
+
+# -------------------------
+# 账户注册表：每个 Google 账户一个 Chrome 配置目录和页面池
+# -------------------------
+class AccountRegistry:
+    """
+    Maps an account id to its own Chrome profile, CDP port and page pool.
+
+    Chrome keeps one Google login per profile, so every account gets its own
+    user data directory under profile_root and its own browser on a port
+    taken from port_base upwards. run() serializes work per account and lock
+    key (the dates an event touches), so two requests cannot both find the
+    same slot free, while other dates and other accounts run in parallel.
+    Accounts idle for longer than idle_timeout are closed by a background
+    sweeper; when max_accounts are open the least recently used idle one is
+    closed to make room, and AccountLimitError is raised if none is idle.
+
+    The default account (no account id) runs on the pool passed in (a
+    CalendarPagePool or ChromeWorkerPool) and is never evicted.
+    """
+
+    def __init__(self, default_pool, profile_root, port_base,
+                 max_accounts=4, idle_timeout=600, pool_size=1, launcher_options=None,
+                 pool_options=None):
+        self.profile_root = profile_root
+        self.port_base = port_base
+        self.max_accounts = max_accounts
+        self.idle_timeout = idle_timeout
+        self.pool_size = pool_size
+        self.launcher_options = dict(launcher_options or {})
+        self.pool_options = dict(pool_options or {})
+        self.evicted = 0
+        self._accounts = {DEFAULT_ACCOUNT: _Account(DEFAULT_ACCOUNT, default_pool)}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper = None
+
+    def start(self):
+        if self._sweeper is not None:
+            return
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="account-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def run(self, account_id, func, *args, lock_keys=(), affinity=None, **kwargs):
+        """Run func(page, *args, **kwargs) on a page logged into account_id."""
+        account = self._acquire(account_id)
+        try:
+            with account.locked(lock_keys):
+                return account.pool.run(func, *args, affinity=affinity or account_id, **kwargs)
+        finally:
+            with self._lock:
+                account.active -= 1
+                account.last_used = time.monotonic()
+
+    def _acquire(self, account_id):
+        account_id = account_id or DEFAULT_ACCOUNT
+        if not ACCOUNT_ID_RE.match(account_id):
+            raise ValueError(f"invalid account id {account_id!r}")
+        to_close = None
+        with self._lock:
+            account = self._accounts.get(account_id)
+            if account is None:
+                to_close = self._make_room()
+                account = self._open(account_id)
+                self._accounts[account_id] = account
+            account.active += 1
+            account.last_used = time.monotonic()
+        if to_close is not None:
+            self._close(to_close)
+        return account
+
+    def _used_ports(self):
+        return {a.launcher.port for a in self._accounts.values() if a.launcher is not None}
+
+    def _open(self, account_id):
+        used = self._used_ports()
+        port = next(p for p in range(self.port_base, self.port_base + self.max_accounts + 1) if p not in used)
+        launcher = ChromeLauncher(
+            user_data_dir=os.path.join(self.profile_root, account_id),
+            port=port,
+            **self.launcher_options,
+        )
+        pool = CalendarPagePool(
+            launcher.cdp_url,
+            size=self.pool_size,
+            ensure_browser=launcher.ensure_started,
+            **self.pool_options,
+        )
+        tracing.debug("Account browser configured", account=account_id, profile=launcher.user_data_dir, port=port)
+        return _Account(account_id, pool, launcher)
+
+    def _make_room(self):
+        # Called with self._lock held; the default account does not count
+        extra = [a for a in self._accounts.values() if a.evictable]
+        if len(extra) < self.max_accounts:
+            return None
+        idle = [a for a in extra if a.active == 0]
+        if not idle:
+            raise AccountLimitError(f"all {self.max_accounts} account browsers are busy")
+        victim = min(idle, key=lambda a: a.last_used)
+        del self._accounts[victim.id]
+        return victim
+
+    def _close(self, account):
+        tracing.debug("Closing idle account browser", account=account.id)
+        self.evicted += 1
+        account.pool.close()
+        account.launcher.stop()
+
+    def _sweep_loop(self):
+        interval = max(1.0, min(60.0, self.idle_timeout / 4))
+        while not self._stop.wait(interval):
+            self.evict_idle()
+
+    def evict_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            stale = [a for a in self._accounts.values()
+                     if a.evictable and a.active == 0 and now - a.last_used > self.idle_timeout]
+            for account in stale:
+                del self._accounts[account.id]
+        for account in stale:
+            self._close(account)
+
+    def stats(self):
+        """Accounts with their own browser; the default account is reported by its pool."""
+        with self._lock:
+            accounts = [a for a in self._accounts.values() if a.evictable]
+        return {
+            "open": len(accounts),
+            "max": self.max_accounts,
+            "evicted": self.evicted,
+            "accounts": {a.id: a.stats() for a in accounts},
+        }
+
+    def close(self):
+        """Close every account browser except the default one (owned by the caller)."""
+        self._stop.set()
+        with self._lock:
+            extra = [a for a in self._accounts.values() if a.evictable]
+            for account in extra:
+                del self._accounts[account.id]
+        for account in extra:
+            self._close(account)
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import tracing
+from tts import tts_worker
+
+AUDIO_SUFFIX = ".wav"
+
+
+def phrase_key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _render_with_engine(text, tmp_path, path):
+    # The temporary file is only touched on the TTS worker, so a caller that
+    # stopped waiting cannot delete it mid-render
+    def render(engine):
+        try:
+            engine.save_to_file(text, tmp_path)
+            engine.runAndWait()
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return render
+
+
+# -------------------------
+# 语音片段缓存
+# -------------------------
+class PhraseAudioCache:
+    """
+    On-disk cache of synthesized prompt audio, keyed by the SHA-256 of the text.
+
+    Missing phrases are rendered once through the TTS worker's pyttsx3 engine
+    (save_to_file) and reused afterwards. When the directory grows past
+    max_bytes the least recently used files are deleted.
+    """
+
+    def __init__(self, directory, max_bytes=50 * 1024 * 1024, render_timeout=30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.render_timeout = render_timeout
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key + AUDIO_SUFFIX)
+
+    def lookup(self, key):
+        """Path of an already rendered phrase, or None."""
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)  # mark as recently used
+        return path
+
+    def get(self, text):
+        """Return (key, path) for text, rendering the audio if needed."""
+        key = phrase_key(text)
+        path = self.lookup(key)
+        if path is not None:
+            self.hits += 1
+            return key, path
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                # Another request may have rendered it while we waited
+                path = self.lookup(key)
+                if path is not None:
+                    self.hits += 1
+                    return key, path
+
+                self.misses += 1
+                path = self.path_for(key)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                future = tts_worker.call(_render_with_engine(text, tmp_path, path))
+                try:
+                    future.result(timeout=self.render_timeout)
+                except FutureTimeoutError:
+                    # Still queued: drop it; already rendering: the worker finishes and caches it
+                    future.cancel()
+                    raise
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+        tracing.debug("Rendered prompt audio", key=key[:12], chars=len(text))
+        self.evict()
+        return key, path
+
+    def prerender(self, texts):
+        """Render texts in the background so first playback is already cached."""
+        def worker():
+            for text in texts:
+                try:
+                    self.get(text)
+                except Exception as e:
+                    tracing.warn("Could not pre-render prompt audio", error=str(e))
+        threading.Thread(target=worker, name="audio-prerender", daemon=True).start()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(AUDIO_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,186 @@
+"""
+End-to-end load benchmark for POST /speech.
+
+    python fake_calendar.py --latency 0.1 &
+    CALENDAR_BASE_URL=http://127.0.0.1:8900 uvicorn main:app &
+    python bench_load.py --requests 200 --concurrency 8
+
+Each client thread posts an utterance from the bench_nlu corpus, then polls
+/jobs/{job_id} until the job finishes. Every utterance gets a unique title
+suffix and idempotency key, so duplicate detection never merges two
+requests. A job that runs into a conflict is counted as such and cancelled
+instead of waiting for a reply; 503 answers count as busy. The report
+covers request throughput, end-to-end latency percentiles of created
+events, the outcome counts, the error rate and the pipeline stage
+histogram read back from /metrics.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_nlu import generate_corpus
+
+DEFAULT_API = "http://127.0.0.1:8000"
+
+# 结果分类：created 计入延迟；failed / timeout / error 计入错误率
+CREATED = "created"
+CONFLICT = "conflict"
+BUSY = "busy"
+DUPLICATE = "duplicate"
+CANCELLED = "cancelled"
+FAILED = "failed"
+TIMEOUT = "timeout"
+ERROR = "error"
+ERROR_OUTCOMES = (FAILED, TIMEOUT, ERROR)
+
+
+def _request(method, url, payload=None, timeout=10):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def unique_texts(texts, run_id=None):
+    """Give every utterance its own title so the content dedupe key differs."""
+    run_id = run_id or uuid.uuid4().hex[:6]
+    return [f"{text}（压测 {run_id}-{i}）" for i, text in enumerate(texts)]
+
+
+def run_one(api, text, job_timeout, poll_interval):
+    """Submit one utterance and follow its job; returns (outcome, seconds, detail)."""
+    started = time.perf_counter()
+    try:
+        job = _request("POST", f"{api}/speech", {"text": text, "idempotency_key": uuid.uuid4().hex})
+        if job["status"] == "failed":
+            return FAILED, time.perf_counter() - started, job.get("error")
+        if job["status"] == "duplicate":
+            return DUPLICATE, time.perf_counter() - started, None
+        deadline = time.monotonic() + job_timeout
+        while time.monotonic() < deadline:
+            snapshot = _request("GET", f"{api}/jobs/{job['job_id']}")
+            status = snapshot["status"]
+            if status == "done":
+                return CREATED, time.perf_counter() - started, None
+            if status == "awaiting_input":
+                # Nobody will answer; release the parked job instead of waiting out the reply timeout
+                seconds = time.perf_counter() - started
+                try:
+                    _request("POST", f"{api}/jobs/{job['job_id']}/cancel")
+                except urllib.error.HTTPError:
+                    pass
+                return CONFLICT, seconds, None
+            if status == "failed":
+                return FAILED, time.perf_counter() - started, snapshot.get("error")
+            if status == "cancelled":
+                return CANCELLED, time.perf_counter() - started, None
+            time.sleep(poll_interval)
+        return TIMEOUT, time.perf_counter() - started, "timeout"
+    except urllib.error.HTTPError as e:
+        if e.code == 503:
+            return BUSY, time.perf_counter() - started, None
+        return ERROR, time.perf_counter() - started, f"HTTP {e.code}"
+    except (urllib.error.URLError, OSError, ValueError, KeyError) as e:
+        return ERROR, time.perf_counter() - started, str(e)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def stage_summary(api):
+    """Mean seconds per stage from the calendar_stage_seconds histogram."""
+    req = urllib.request.Request(f"{api}/metrics")
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        text = resp.read().decode("utf-8")
+    sums, counts = {}, {}
+    for line in text.splitlines():
+        for suffix, target in (("_sum", sums), ("_count", counts)):
+            prefix = f"calendar_stage_seconds{suffix}{{stage=\""
+            if line.startswith(prefix):
+                labels, value = line.rsplit(" ", 1)
+                target[labels[len(prefix):-2]] = float(value)
+    return {stage: sums[stage] / counts[stage] for stage in sums if counts.get(stage)}
+
+
+def run_load(api, texts, concurrency, job_timeout=120, poll_interval=0.2):
+    lock = threading.Lock()
+    latencies = []
+    outcomes = {}
+    errors = {}
+
+    def client(text):
+        outcome, seconds, detail = run_one(api, text, job_timeout, poll_interval)
+        with lock:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            if outcome == CREATED:
+                latencies.append(seconds)
+            elif outcome in ERROR_OUTCOMES:
+                errors[detail] = errors.get(detail, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, texts))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    failed = sum(errors.values())
+    return {
+        "requests": len(texts),
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": _percentile(latencies, 0.50),
+        "p95": _percentile(latencies, 0.95),
+        "p99": _percentile(latencies, 0.99),
+        "error_rate": failed / len(texts) if texts else 0.0,
+        "outcomes": outcomes,
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--api", default=DEFAULT_API, help="backend base URL")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--job-timeout", type=float, default=120,
+                        help="seconds to wait for a single job before counting it as failed")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    texts = unique_texts([case["text"] for case in generate_corpus(args.requests, args.seed)])
+    result = run_load(args.api.rstrip("/"), texts, args.concurrency,
+                      args.job_timeout, args.poll_interval)
+
+    print(f"requests          {result['requests']} (concurrency {result['concurrency']})")
+    print(f"elapsed           {result['elapsed']:.1f} s")
+    print(f"throughput        {result['throughput']:.2f} jobs/s")
+    print(f"latency p50/p95/p99  {result['p50']:.2f} / {result['p95']:.2f} / {result['p99']:.2f} s")
+    print("outcomes          " + ", ".join(f"{k} {v}" for k, v in sorted(result["outcomes"].items())))
+    print(f"error rate        {result['error_rate']:.2%}")
+    for detail, count in sorted(result["errors"].items(), key=lambda kv: -kv[1]):
+        print(f"  {count:5d}  {detail}")
+
+    try:
+        stages = stage_summary(args.api.rstrip("/"))
+    except (urllib.error.URLError, OSError) as e:
+        print(f"[WARN] Could not read /metrics: {e}")
+        return
+    if stages:
+        print("mean stage time")
+        for stage, seconds in sorted(stages.items(), key=lambda kv: -kv[1]):
+            print(f"  {stage:<22}{seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
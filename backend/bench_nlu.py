@@ -0,0 +1,261 @@
+"""
+Offline throughput / accuracy benchmark for nlu.parse_event.
+
+    python bench_nlu.py                    # run and compare with the baseline
+    python bench_nlu.py --update-baseline  # store the current numbers
+
+A seeded generator builds Chinese scheduling utterances (今天/明天/后天, every
+period word, 半/一刻/三刻/N分 minutes, ranges with 到/至/-) together with the
+start and end they should parse to. Parsing uses a fixed "now", so the run is
+reproducible. The exit code is 1 when throughput or accuracy falls below the
+stored baseline.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import nlu
+
+NOW = datetime(2025, 1, 6, 9, 30)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_nlu_baseline.json")
+
+DAY_WORDS = {"": 0, "今天": 0, "明天": 1, "后天": 2}
+PERIODS = ["", "上午", "下午", "早上", "晚上", "凌晨"]
+SEPARATORS = ["到", "至", "-", " 到 ", " - "]
+TITLES = ["开会", "和客户吃饭", "健身", "看医生", "给妈妈打电话", "写周报", "面试", "上课", "取快递", "项目评审"]
+CN_DIGITS = "零一二三四五六七八九"
+
+
+# -------------------------
+# 语料生成
+# -------------------------
+def hour_to_chinese(hour):
+    if hour < 10:
+        return CN_DIGITS[hour]
+    if hour == 10:
+        return "十"
+    if hour < 20:
+        return "十" + CN_DIGITS[hour - 10]
+    return CN_DIGITS[hour // 10] + "十" + (CN_DIGITS[hour % 10] if hour % 10 else "")
+
+
+def apply_period(hour, period):
+    if period in ("下午", "晚上") and hour < 12:
+        return hour + 12
+    if period in ("上午", "凌晨", "早上") and hour == 12:
+        return 0
+    return hour
+
+
+def random_clock(rng, period):
+    """Return (spoken text, hour, minute) for a time point like 三点半."""
+    hour = rng.randint(1, 12) if period else rng.randint(0, 23)
+    spoken_hour = hour_to_chinese(hour) if rng.random() < 0.6 else str(hour)
+
+    kind = rng.randrange(5)
+    if kind == 0:
+        spoken_minute, minute = "", 0
+    elif kind == 1:
+        spoken_minute, minute = "半", 30
+    elif kind == 2:
+        spoken_minute, minute = "一刻", 15
+    elif kind == 3:
+        spoken_minute, minute = "三刻", 45
+    else:
+        minute = rng.randint(1, 59)
+        spoken_minute = f"{minute}分"
+    return f"{spoken_hour}点{spoken_minute}", hour, minute
+
+
+def generate_case(rng):
+    day_word = rng.choice(list(DAY_WORDS))
+    period = rng.choice(PERIODS)
+    day = (NOW + timedelta(days=DAY_WORDS[day_word])).replace(hour=0, minute=0)
+
+    spoken, hour, minute = random_clock(rng, period)
+    start = day.replace(hour=apply_period(hour, period), minute=minute)
+    time_text = f"{day_word}{period}{spoken}"
+
+    end = start + timedelta(hours=1)
+    if rng.random() < 0.6:
+        # Ranges never cross midnight; late starts fall back to a single time
+        for _ in range(10):
+            end_period = rng.choice(["", "", period] + PERIODS[1:]) if period else ""
+            end_spoken, end_hour, end_minute = random_clock(rng, end_period or period)
+            range_end = day.replace(hour=apply_period(end_hour, end_period or period), minute=end_minute)
+            if range_end > start:
+                end = range_end
+                time_text += f"{rng.choice(SEPARATORS)}{end_period}{end_spoken}"
+                break
+
+    title = rng.choice(TITLES)
+    text = f"{time_text}{title}" if rng.random() < 0.7 else f"{title}{time_text}"
+    return {
+        "text": text,
+        "start": start.strftime("%Y-%m-%d %H:%M"),
+        "end": end.strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+def generate_corpus(size, seed=0):
+    rng = random.Random(seed)
+    return [generate_case(rng) for _ in range(size)]
+
+
+# -------------------------
+# 测量
+# -------------------------
+def _is_correct(case, event):
+    return (f"{event['start_date']} {event['start_time']}" == case["start"]
+            and f"{event['end_date']} {event['end_time']}" == case["end"])
+
+
+def run_benchmark(corpus, memory_sample=1000):
+    nlu.parse_cache.clear()
+
+    latencies = []
+    correct = 0
+    errors = 0
+    started = time.perf_counter()
+    for case in corpus:
+        t0 = time.perf_counter_ns()
+        try:
+            event = nlu.parse_event(case["text"], now=NOW)
+        except ValueError:
+            event = None
+        latencies.append(time.perf_counter_ns() - t0)
+        if event is None:
+            errors += 1
+        elif _is_correct(case, event):
+            correct += 1
+    elapsed = time.perf_counter() - started
+
+    # Repeated utterances that fit in the parse cache
+    hot = corpus[:nlu.PARSE_CACHE_SIZE // 2]
+    hot_rounds = max(1, len(corpus) // max(1, len(hot)))
+    nlu.parse_cache.clear()
+    for case in hot:
+        try:
+            nlu.parse_event(case["text"], now=NOW)
+        except ValueError:
+            pass
+    warm_started = time.perf_counter()
+    for _ in range(hot_rounds):
+        for case in hot:
+            try:
+                nlu.parse_event(case["text"], now=NOW)
+            except ValueError:
+                pass
+    warm_elapsed = time.perf_counter() - warm_started
+
+    # Peak allocation of a single uncached parse
+    sample = corpus[:memory_sample]
+    peaks = []
+    tracemalloc.start()
+    for case in sample:
+        nlu.parse_cache.clear()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        try:
+            nlu.parse_event(case["text"], now=NOW)
+        except ValueError:
+            pass
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    nlu.parse_cache.clear()
+
+    latencies.sort()
+    return {
+        "utterances": len(corpus),
+        "parses_per_sec": len(corpus) / elapsed,
+        "cached_parses_per_sec": hot_rounds * len(hot) / warm_elapsed,
+        "p50_us": latencies[len(latencies) // 2] / 1000,
+        "p99_us": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] / 1000,
+        "bytes_per_parse": statistics.mean(peaks) if peaks else 0,
+        "accuracy": correct / len(corpus),
+        "errors": errors,
+    }
+
+
+def check_against_baseline(result, baseline, tolerance):
+    failures = []
+    min_throughput = baseline["parses_per_sec"] * (1 - tolerance)
+    if result["parses_per_sec"] < min_throughput:
+        failures.append(
+            f"throughput {result['parses_per_sec']:.0f}/s below {min_throughput:.0f}/s "
+            f"(baseline {baseline['parses_per_sec']:.0f}/s - {tolerance:.0%})"
+        )
+    if result["accuracy"] < baseline["accuracy"]:
+        failures.append(f"accuracy {result['accuracy']:.4f} below baseline {baseline['accuracy']:.4f}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=30000, help="number of generated utterances")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="allowed throughput drop relative to the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--show-failures", type=int, default=0, metavar="N",
+                        help="print the first N mis-parsed utterances")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.size, args.seed)
+    result = run_benchmark(corpus)
+
+    print(f"utterances        {result['utterances']}")
+    print(f"parses/sec        {result['parses_per_sec']:.0f} (cached {result['cached_parses_per_sec']:.0f})")
+    print(f"latency p50/p99   {result['p50_us']:.1f} / {result['p99_us']:.1f} us")
+    print(f"memory/parse      {result['bytes_per_parse']:.0f} bytes")
+    print(f"accuracy          {result['accuracy']:.4f} ({result['errors']} errors)")
+
+    if args.show_failures:
+        shown = 0
+        for case in corpus:
+            try:
+                event = nlu.parse_event(case["text"], now=NOW)
+            except ValueError as e:
+                event = {"error": str(e)}
+            if "error" in event or not _is_correct(case, event):
+                print("  MISS", case, event)
+                shown += 1
+                if shown >= args.show_failures:
+                    break
+
+    if args.update_baseline:
+        baseline = {
+            "size": args.size,
+            "seed": args.seed,
+            "parses_per_sec": round(result["parses_per_sec"]),
+            "accuracy": round(result["accuracy"], 4),
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("[WARN] No baseline found, run with --update-baseline to create one")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if (baseline.get("size"), baseline.get("seed")) != (args.size, args.seed):
+        print("[WARN] Corpus size/seed differ from the baseline run; accuracy is not comparable")
+    failures = check_against_baseline(result, baseline, args.tolerance)
+    for failure in failures:
+        print("[FAIL]", failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
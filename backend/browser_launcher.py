@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import tracing
+
+WINDOWS_CHROME_PATH = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
+MAC_CHROME_PATH = "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
+LINUX_CHROME_NAMES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser")
+
+
+def default_chrome_path():
+    if os.name == "nt":
+        return WINDOWS_CHROME_PATH
+    if sys.platform == "darwin":
+        return MAC_CHROME_PATH
+    for name in LINUX_CHROME_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return LINUX_CHROME_NAMES[0]
+
+
+def default_profile_dir():
+    if os.name == "nt":
+        return r"C:\temp\chrome_debug_profile"
+    return os.path.join(os.path.expanduser("~"), ".cache", "voice-calendar", "chrome_profile")
+
+
+class BrowserLaunchError(RuntimeError):
+    pass
+
+
+# -------------------------
+# Chrome 启动器
+# -------------------------
+class ChromeLauncher:
+    """
+    Starts Chrome with remote debugging and waits until CDP answers.
+
+    ensure_started() is idempotent and thread-safe: if something is already
+    serving /json/version on the port (for example a Chrome the user opened
+    by hand) it is reused, otherwise Chrome is spawned and the endpoint is
+    polled until it responds, the process exits or startup_timeout passes.
+    """
+
+    def __init__(self, binary=None, user_data_dir=None, port=9222, headless=False,
+                 startup_timeout=30, poll_interval=0.1, extra_args=()):
+        self.binary = binary or default_chrome_path()
+        self.user_data_dir = user_data_dir or default_profile_dir()
+        self.port = port
+        self.headless = headless
+        self.startup_timeout = startup_timeout
+        self.poll_interval = poll_interval
+        self.extra_args = list(extra_args)
+        self.process = None
+        self.startup_seconds = None
+        self._lock = threading.Lock()
+
+    @property
+    def cdp_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def command(self):
+        cmd = [
+            self.binary,
+            f"--remote-debugging-port={self.port}",
+            f"--user-data-dir={self.user_data_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+        ]
+        if self.headless:
+            cmd.append("--headless=new")
+        return cmd + self.extra_args
+
+    def version(self, timeout=1.0):
+        """Return the /json/version payload, or None if CDP is not answering."""
+        try:
+            with urllib.request.urlopen(f"{self.cdp_url}/json/version", timeout=timeout) as resp:
+                return json.loads(resp.read().decode("utf-8"))
+        except (urllib.error.URLError, OSError, ValueError):
+            return None
+
+    def is_ready(self):
+        return self.version() is not None
+
+    def ensure_started(self):
+        with self._lock:
+            if self.process is not None and self.process.poll() is not None:
+                tracing.warn("Chrome exited", port=self.port, code=self.process.returncode)
+                self.process = None
+            if self.is_ready():
+                return self.cdp_url
+
+            os.makedirs(self.user_data_dir, exist_ok=True)
+            started = time.monotonic()
+            try:
+                self.process = subprocess.Popen(self.command())
+            except OSError as e:
+                raise BrowserLaunchError(f"cannot start Chrome at {self.binary!r}: {e}") from e
+
+            deadline = started + self.startup_timeout
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise BrowserLaunchError(
+                        f"Chrome exited during startup with code {self.process.returncode}"
+                    )
+                info = self.version(timeout=self.poll_interval * 5)
+                if info is not None:
+                    self.startup_seconds = time.monotonic() - started
+                    tracing.debug("Chrome ready", port=self.port, seconds=round(self.startup_seconds, 2),
+                                  browser=info.get("Browser", "unknown"))
+                    return self.cdp_url
+                time.sleep(self.poll_interval)
+
+            self._terminate()
+            raise BrowserLaunchError(
+                f"Chrome did not answer on {self.cdp_url} within {self.startup_timeout}s"
+            )
+
+    def _terminate(self, timeout=5):
+        proc, self.process = self.process, None
+        if proc is None or proc.poll() is not None:
+            return
+        proc.terminate()
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    def stop(self):
+        """Shut down the Chrome we started; a reused external browser is left alone."""
+        with self._lock:
+            if self.process is not None:
+                tracing.debug("Stopping Chrome", port=self.port)
+            self._terminate()
@@ -0,0 +1,249 @@
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from playwright.sync_api import sync_playwright
+
+import tracing
+from metrics import span
+from session_health import LoginState
+
+CALENDAR_URL = "https://calendar.google.com"
+
+
+class PagePoolClosed(RuntimeError):
+    pass
+
+
+class _Task:
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        # Runs in the submitter's context so its trace request id follows it
+        self.context = contextvars.copy_context()
+
+
+_STOP = object()
+
+_slot_local = threading.local()
+# Pages used outside a pool (e.g. calendar_bot.add_event_to_calendar)
+_standalone_login = LoginState()
+
+
+def current_login_state():
+    """LoginState of the browser the calling page slot works on."""
+    return getattr(_slot_local, "login", _standalone_login)
+
+
+# -------------------------
+# 单个工作槽：持有一个 Playwright 连接和一个预热好的日历页面
+# -------------------------
+class _PageSlot:
+    """
+    One pool slot. Playwright's sync API is bound to the thread that created
+    it, so every slot owns a thread, its own CDP connection and one warm page.
+    """
+
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        self.browser = None
+        self.page = None
+        self.page_born = 0.0
+        self.page_uses = 0
+        self.crashed = False
+        self.busy = False
+        self.recycled = 0
+        self.thread = threading.Thread(
+            target=self._run, name=f"calendar-page-{index}", daemon=True
+        )
+
+    # ---------- page lifecycle ----------
+    def _connect(self, playwright):
+        if self.browser is not None and self.browser.is_connected():
+            return
+        if self.pool.ensure_browser is not None:
+            self.pool.ensure_browser()
+        tracing.debug("Page slot connecting", slot=self.index, cdp_url=self.pool.cdp_url)
+        with span("cdp_connect"):
+            self.browser = playwright.chromium.connect_over_cdp(self.pool.cdp_url)
+        self.page = None
+
+    def _open_page(self, playwright):
+        self._connect(playwright)
+        context = self.browser.contexts[0]
+        page = context.new_page()
+        page.on("crash", self._on_crash)
+        page.goto(self.pool.warm_url, wait_until="load")
+        self.page = page
+        self.page_born = time.monotonic()
+        self.page_uses = 0
+        self.crashed = False
+        if tracing.enabled(tracing.DEBUG):
+            tracing.debug("Page slot warm page ready", slot=self.index, title=page.title())
+
+    def _on_crash(self, _page):
+        tracing.warn("Page slot page crashed", slot=self.index)
+        self.crashed = True
+
+    def _close_page(self):
+        page, self.page = self.page, None
+        if page is None:
+            return
+        try:
+            if not page.is_closed():
+                page.close()
+        except Exception as e:
+            tracing.warn("Page slot close failed", slot=self.index, error=str(e))
+
+    def _is_healthy(self):
+        page = self.page
+        if page is None or self.crashed or page.is_closed():
+            return False
+        if self.browser is None or not self.browser.is_connected():
+            return False
+        if time.monotonic() - self.page_born > self.pool.max_page_age:
+            return False
+        if self.page_uses >= self.pool.max_page_uses:
+            return False
+        try:
+            page.evaluate("1")
+        except Exception:
+            return False
+        return True
+
+    def _ensure_page(self, playwright):
+        if self._is_healthy():
+            return self.page
+        if self.page is not None:
+            self.recycled += 1
+            tracing.debug("Page slot recycling stale page", slot=self.index)
+        self._close_page()
+        self._open_page(playwright)
+        return self.page
+
+    # ---------- worker loop ----------
+    def _run(self):
+        _slot_local.login = self.pool.login_state
+        with sync_playwright() as p:
+            try:
+                self._open_page(p)
+            except Exception as e:
+                tracing.warn("Page slot warm-up failed", slot=self.index, error=str(e))
+
+            while True:
+                try:
+                    task = self.pool._tasks.get(timeout=self.pool.health_interval)
+                except queue.Empty:
+                    # Idle: keep the warm page healthy and the login state fresh for the next request
+                    try:
+                        self.pool.login_state.refresh_if_due(self._ensure_page(p))
+                    except Exception as e:
+                        tracing.warn("Page slot health check failed", slot=self.index, error=str(e))
+                    continue
+
+                if task is _STOP:
+                    break
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+
+                self.busy = True
+                try:
+                    page = self._ensure_page(p)
+                    result = task.context.run(task.func, page, *task.args, **task.kwargs)
+                except BaseException as e:
+                    task.future.set_exception(e)
+                    # The page may be in an unknown state after a failure
+                    self.page_uses = self.pool.max_page_uses
+                else:
+                    task.future.set_result(result)
+                    self.page_uses += 1
+                finally:
+                    self.busy = False
+
+            self._close_page()
+
+
+# -------------------------
+# 页面池
+# -------------------------
+class CalendarPagePool:
+    """
+    Long-lived pool of logged-in Google Calendar pages.
+
+    Callers hand a function to run() and it is executed as
+    func(page, *args, **kwargs) on a free warm page; the page goes back to
+    the pool afterwards. Pages that crash, fail a task, get too old or have
+    served too many tasks are closed and replaced.
+
+    ensure_browser, if given, is called before every (re)connect so the
+    browser can be launched lazily or restarted after it went away.
+
+    All slots share one LoginState (the browser's cookies are shared too);
+    tasks reach it through current_login_state().
+    """
+
+    def __init__(self, cdp_url, size=2, max_page_age=900, max_page_uses=50,
+                 health_interval=30, warm_url=CALENDAR_URL, ensure_browser=None,
+                 login_ttl=300, login_poll_interval=1.0):
+        self.cdp_url = cdp_url
+        self.login_state = LoginState(ttl=login_ttl, poll_interval=login_poll_interval)
+        self.ensure_browser = ensure_browser
+        self.size = size
+        self.max_page_age = max_page_age
+        self.max_page_uses = max_page_uses
+        self.health_interval = health_interval
+        self.warm_url = warm_url
+        self._tasks = queue.Queue()
+        self._slots = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._slots:
+                return
+            for i in range(self.size):
+                slot = _PageSlot(self, i)
+                self._slots.append(slot)
+                slot.thread.start()
+        tracing.debug("Calendar page pool started", pages=self.size)
+
+    def submit(self, func, *args, **kwargs):
+        if self._closed:
+            raise PagePoolClosed("calendar page pool is closed")
+        if not self._slots:
+            self.start()
+        task = _Task(func, args, kwargs)
+        self._tasks.put(task)
+        return task.future
+
+    def run(self, func, *args, timeout=None, affinity=None, **kwargs):
+        # affinity only matters to ChromeWorkerPool; a single pool has no routing choice
+        return self.submit(func, *args, **kwargs).result(timeout=timeout)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "busy": sum(1 for s in self._slots if s.busy),
+            "warm": sum(1 for s in self._slots if s.page is not None),
+            "queued": self._tasks.qsize(),
+            "recycled": sum(s.recycled for s in self._slots),
+            "login": self.login_state.stats(),
+        }
+
+    def close(self, timeout=10):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            slots = list(self._slots)
+        for _ in slots:
+            self._tasks.put(_STOP)
+        for slot in slots:
+            slot.thread.join(timeout=timeout)
+        tracing.debug("Calendar page pool closed")
@@ -1,191 +1,286 @@
+import os
 import time
-import re
-from playwright.sync_api import sync_playwright, expect
-from nlu import parse_event
-import pyttsx3 
-import speech_recognition as sr
+from urllib.parse import urlencode
+from playwright.sync_api import sync_playwright
+from jobs import CHECKING_CONFLICTS, CREATING
+from conflicts import (
+    ConflictIndex, Interval, event_interval, interval_to_dict, nearest_free_slots, minutes_to_hhmm,
+    week_indexes, event_conflicts, event_dates, add_busy_event, decode_datekey,
+)
+from tts import speak, PRIORITY_HIGH, PRIORITY_NORMAL
+import tracing
+from metrics import span, CONFLICTS, LOGIN_WAITS, FALLBACK_OPTION_PICKS, CREATE_MODE_FALLBACKS
+from browser_session import current_login_state
+from session_health import LoginRequired, redirected_to_login
+from waits import goto, wait_for_grid, wait_visible, wait_hidden, wait_for_options, wait_for_url
+from time_utils import time_to_minutes
 from datetime import datetime, timedelta
 
 DEBUG_PORT = 9222
 
-latest_recognized_text = None
+# Google 日历地址；性能测试时可指向本地的 fake_calendar.py
+CALENDAR_BASE_URL = os.getenv("CALENDAR_BASE_URL", "https://calendar.google.com").rstrip("/")
+
+# 登录提示最短重复间隔（秒）
+LOGIN_PROMPT_COOLDOWN = 60
+
+# 在页面内一次取出所有事件：筛选 "to" 按钮、解析最后一行的时间段（规则同 conflicts.parse_button_texts），
+# 返回 {columns: [周视图列 datekey], events: [[datekey 或 null, 开始分钟, 结束分钟, 文本]]}
+EXTRACT_EVENTS_JS = r"""
+() => {
+    const RANGE = /(\d{1,2})(?::(\d{2}))?\s?(am|pm)?\s*–\s*(\d{1,2})(?::(\d{2}))?\s?(am|pm)?/i;
+    const toMinutes = (hour, minute, meridiem) => {
+        hour = Number(hour);
+        if (meridiem === "am" && hour === 12) hour = 0;
+        if (meridiem === "pm" && hour !== 12) hour += 12;
+        return hour * 60 + Number(minute || 0);
+    };
+    const events = [];
+    for (const button of document.querySelectorAll('[role="grid"] [role="button"]')) {
+        const text = button.innerText;
+        if (!text.includes("to")) continue;
+        const lines = text.trim().split("\n");
+        const m = RANGE.exec(lines[lines.length - 1]);
+        if (!m) continue;
+        let startMeridiem = m[3] && m[3].toLowerCase();
+        let endMeridiem = m[6] && m[6].toLowerCase();
+        if (!startMeridiem && !endMeridiem) continue;
+        startMeridiem = startMeridiem || endMeridiem;
+        endMeridiem = endMeridiem || startMeridiem;
+        const start = toMinutes(m[1], m[2], startMeridiem);
+        let end = toMinutes(m[4], m[5], endMeridiem);
+        if (end <= start) end += 24 * 60;
+        const column = button.closest("[data-datekey]");
+        events.push([column ? Number(column.dataset.datekey) : null, start, end, text]);
+    }
+    const columns = [...document.querySelectorAll('[role="grid"] [data-datekey]')].map(c => Number(c.dataset.datekey));
+    return {columns, events};
+}
+"""
+
+# 事件创建方式：url = 打开预填好的编辑页面只点保存；form = 逐步填写表单
+CREATE_MODE_URL = "url"
+CREATE_MODE_FORM = "form"
+CREATE_MODES = (CREATE_MODE_URL, CREATE_MODE_FORM)
+
+EVENT_EDIT_URL = f"{CALENDAR_BASE_URL}/calendar/u/0/r/eventedit"
+
+# 冲突检查抓取方式："week" 一次加载整周视图，"day" 逐日加载
+SCRAPE_MODE_WEEK = "week"
+SCRAPE_MODE_DAY = "day"
+SCRAPE_MODES = (SCRAPE_MODE_WEEK, SCRAPE_MODE_DAY)
+SCRAPE_MODE = os.getenv("SCRAPE_MODE", SCRAPE_MODE_WEEK)
+if SCRAPE_MODE not in SCRAPE_MODES:
+    raise ValueError(f"SCRAPE_MODE must be one of {SCRAPE_MODES}, got {SCRAPE_MODE!r}")
+
+# 冲突时推荐空闲时段：工作时间范围、向后查找的天数和推荐个数
+WORK_DAY_START = os.getenv("WORK_DAY_START", "09:00")
+WORK_DAY_END = os.getenv("WORK_DAY_END", "18:00")
+FREE_SLOT_DAYS = int(os.getenv("FREE_SLOT_DAYS", "3"))
+FREE_SLOT_LIMIT = int(os.getenv("FREE_SLOT_LIMIT", "3"))
+
+# 语音提示模板
+LOGIN_EXPIRED_MESSAGE = "Google 登录已过期，请重新登录。"
+CONFLICT_TIME_MESSAGE = "您在{start_date} {start_time}到{end_time}"
+SLOT_MESSAGE = "{start_date} {start_time}到{end_time}"
+# 提示中固定不变的片段，按 id 预先渲染成音频（GET /audio/{phrase}）
+PROMPT_PHRASES = {
+    "conflict": "已有日程安排，请在前端重新创造新日程。",
+    "suggestions": "最近的空闲时间有：",
+}
+
+
+def conflict_prompt_parts(event, suggestions=()):
+    """
+    The conflict prompt as spoken segments, in order. Fixed fragments are
+    {"phrase": id, "text"} and can be played from the audio cache; dates
+    and times are {"text"} only and left to the browser's speech synthesis.
+    """
+    parts = [
+        {"text": CONFLICT_TIME_MESSAGE.format(**event)},
+        {"phrase": "conflict", "text": PROMPT_PHRASES["conflict"]},
+    ]
+    if suggestions:
+        parts.append({"phrase": "suggestions", "text": PROMPT_PHRASES["suggestions"]})
+        parts.append({"text": "、".join(SLOT_MESSAGE.format(**s) for s in suggestions) + "。"})
+    return parts
 
-def speak_message(message):
-    print("[DEBUG] Initializing TTS engine")
-    engine = pyttsx3.init()
 
-    # List available voices
-    voices = engine.getProperty('voices')
-    print(f"[DEBUG] Found {len(voices)} voices")
+def conflict_message(event, suggestions=()):
+    return "".join(part["text"] for part in conflict_prompt_parts(event, suggestions))
 
-    for v in voices:
-        print("[VOICE]", v.id, v.name, v.languages)
 
-    # Choose a voice that supports Chinese
-    zh_voice = None
-    for v in voices:
-        if "zh" in v.id.lower() or "chinese" in v.name.lower():
-            zh_voice = v.id
-            print(f"[DEBUG] Using Chinese voice: {v.name}")
-            break
+def speak_message(message, priority=PRIORITY_NORMAL, cooldown=0):
+    """Queue message on the background TTS worker; never blocks the caller."""
+    speak(message, priority=priority, cooldown=cooldown)
 
-    if zh_voice:
-        engine.setProperty('voice', zh_voice)
-    else:
-        print("[WARN] No Chinese voice found, using default")
 
-    print("[DEBUG] Speaking message:", message)
-    engine.say(message)
-    engine.runAndWait()
+def goto_calendar(page, url, step):
+    """goto() a calendar view; raises LoginRequired if Google sent the page to sign in."""
+    goto(page, url, step=step)
+    if redirected_to_login(page):
+        # The session ended after the login state was last verified
+        current_login_state().record(False)
+        raise LoginRequired(f"redirected to sign-in while loading {url}")
 
 
-def time_to_minutes(time_str):
-    """Convert time string like '10:00am', '14:30', or '2pm' to minutes since midnight"""
-    time_str = time_str.strip().lower()
+def extract_events(page):
+    """
+    Every event on the loaded view in one round trip.
 
-    # Remove spaces
-    time_str = time_str.replace(" ", "")
+    The filtering and time parsing run inside the page (EXTRACT_EVENTS_JS)
+    instead of one CDP call per grid, button and inner_text. Returns
+    (column dates, [(date or None, Interval)]); the date is None outside
+    the week view.
+    """
+    with span("scrape_events"):
+        data = page.evaluate(EXTRACT_EVENTS_JS)
+    dates = [decode_datekey(key) for key in data["columns"]]
+    events = [
+        (decode_datekey(key) if key is not None else None, Interval(start, end, text))
+        for key, start, end, text in data["events"]
+    ]
+    return dates, events
 
-    # Match hour:minute
-    match = re.match(r'(\d{1,2})(?::(\d{2}))?(am|pm)?', time_str)
-    if not match:
-        return 0  # fallback
 
-    hour = int(match.group(1))
-    minute = int(match.group(2)) if match.group(2) else 0
-    meridiem = match.group(3)
+def scrape_day_events(page, date):
+    """Load the day view for date (YYYY-MM-DD) and return its events as Intervals."""
+    url = f"{CALENDAR_BASE_URL}/calendar/u/0/r/day/{date.replace('-', '/')}"
+    with span("day_view_navigation"):
+        goto_calendar(page, url, step="day_view")
+        wait_for_grid(page)
 
-    if meridiem == "pm" and hour != 12:
-        hour += 12
-    if meridiem == "am" and hour == 12:
-        hour = 0
+    events = [interval for _, interval in extract_events(page)[1]]
 
-    return hour * 60 + minute
+    tracing.debug("Scraped day view", date=date, events=len(events))
+    return events
 
 
-def normalize_event(start_str, end_str):
-    print("start_str", start_str)
-    start_min = time_to_minutes(start_str)
-    end_min = time_to_minutes(end_str)
-    if end_min <= start_min:
-        end_min += 24*60  # handle overnight events
-    return start_min, end_min
+def scrape_week_events(page, date):
+    """Load the week view containing date and return {date: [Interval]} per day column."""
+    url = f"{CALENDAR_BASE_URL}/calendar/u/0/r/week/{date.replace('-', '/')}"
+    with span("week_view_navigation"):
+        goto_calendar(page, url, step="week_view")
+        wait_for_grid(page)
 
-def convert_ampm_to_24h(time_str):
-    """
-    Converts a time string like '11pm' or '7:30am' into 'HH:MM' 24-hour format.
-    """
-    time_str = time_str.strip().lower()
+    dates, events = extract_events(page)
+    columns = {day: [] for day in dates}
+    for day, interval in events:
+        if day is not None:
+            columns.setdefault(day, []).append(interval)
 
-    print("time_str", time_str)
-    
-    # Separate the number part from am/pm
-    if time_str.endswith('am') or time_str.endswith('pm'):
-        ampm = time_str[-2:]
-        time_part = time_str[:-2].strip()
-    else:
-        raise ValueError(f"Time must end with 'am' or 'pm': '{time_str}'")
-    
-    # Handle hours and optional minutes
-    if ':' in time_part:
-        hours, minutes = map(int, time_part.split(':'))
-    else:
-        hours = int(time_part)
-        minutes = 0
-    
-    # Convert to 24-hour time
-    if ampm == 'am' and hours == 12:
-        hours = 0
-    elif ampm == 'pm' and hours != 12:
-        hours += 12
-    
-    return f"{hours:02d}:{minutes:02d}"
+    tracing.debug("Scraped week view", date=date, days=len(columns), events=len(events))
+    return columns
 
 
-def convert_range_to_24h(range_str):
-    """
-    Converts a range like '3-4pm', '3pm-4', or '3 – 4pm'
-    into start and end in 'HH:MM' 24-hour format.
-    """
-    # Normalize dash symbols
-    range_str = range_str.replace('–', '-').replace('—', '-')
-
-    if '-' not in range_str:
-        raise ValueError(f"Invalid range format: '{range_str}'")
-
-    start_part, end_part = map(str.strip, range_str.split('-'))
-
-    start_lower = start_part.lower()
-    end_lower = end_part.lower()
+def day_index(page, date):
+    """ConflictIndex over the busy events scraped from date's day view."""
+    return ConflictIndex(scrape_day_events(page, date))
 
-    start_has_ampm = start_lower.endswith(('am', 'pm'))
-    end_has_ampm = end_lower.endswith(('am', 'pm'))
 
-    # If only end has am/pm → append to start
-    if not start_has_ampm and end_has_ampm:
-        start_part += end_part[-2:]
-
-    # If only start has am/pm → append to end
-    if start_has_ampm and not end_has_ampm:
-        end_part += start_part[-2:]
+def load_indexes(page, dates, indexes=None, store=None):
+    """
+    Make sure indexes (date -> ConflictIndex) covers every date and return it.
+
+    A day still fresh in store (an event_store.AccountEvents) is taken from
+    there without navigating; everything scraped is saved back to it with
+    the time the scrape started, so events created meanwhile on days this
+    caller holds no lock for are not overwritten (see EventStore). In
+    week mode one week view fills in all seven days around a missing date,
+    so later dates in the same week need no navigation; days already in
+    indexes (possibly with events added since) are kept as they are.
+    Falls back to the day view when the week view has no column for a date.
+    """
+    indexes = {} if indexes is None else indexes
+    for date in sorted(set(dates)):
+        if date in indexes:
+            continue
+        if store is not None:
+            index = store.fresh_day(date)
+            if index is not None:
+                indexes[date] = index
+                continue
+        started = time.time()
+        if SCRAPE_MODE == SCRAPE_MODE_WEEK:
+            columns = scrape_week_events(page, date)
+            if date in columns:
+                for day, index in week_indexes(columns).items():
+                    indexes.setdefault(day, index)
+                    if store is not None:
+                        store.save_day(day, index, started)
+                continue
+            tracing.warn("Week view has no column for date, loading the day view", date=date)
+        indexes[date] = day_index(page, date)
+        if store is not None:
+            store.save_day(date, indexes[date], started)
+    return indexes
+
+
+def find_conflicts(page, event, indexes=None, store=None):
+    """
+    Return every scraped event overlapping a parsed event.
 
-    start_24 = convert_ampm_to_24h(start_part)
-    end_24 = convert_ampm_to_24h(end_part)
+    Overnight events are checked against both days they touch. indexes
+    (date -> ConflictIndex) is filled in with whatever had to be loaded.
+    """
+    indexes = load_indexes(page, event_dates(event), indexes, store)
+    conflicts = event_conflicts(indexes, event)
+    if conflicts:
+        CONFLICTS.inc()
+        tracing.debug("Conflicts found", count=len(conflicts),
+                      times=[c.text.strip().splitlines()[-1] for c in conflicts])
+    return conflicts
 
-    return start_24, end_24
 
+def is_slot_occupied(page, date, original_start_time, original_end_time):
+    event = {"title": "", "start_date": date, "start_time": original_start_time, "end_time": original_end_time}
+    return bool(find_conflicts(page, event))
 
 
+def suggest_free_slots(page, event, indexes=None, store=None):
+    """
+    Up to FREE_SLOT_LIMIT open slots as long as event, nearest to its start.
 
-def is_slot_occupied(page, date, original_start_time, original_end_time):
-    url = f"https://calendar.google.com/calendar/u/0/r/day/{date.replace('-', '/')}"
-    page.goto(url)
-
-    events = []
-
-    grids = page.query_selector_all('[role="grid"]')
-    for grid in grids:
-        buttons = grid.query_selector_all('[role="button"]')
-        for button in buttons:
-            text = button.inner_text()
-            if "to" in text:
-                events.append(text)
-                print("event", events)
-
-    start_end_times = []
-
-    for event_text in events:
-        # Take only the text after the last \n
-        last_line = event_text.strip().split("\n")[-1]  # e.g., '2:30 – 3:30am'
-
-        #Extract times separated by en dash "–"
-        match = re.search(r'(\d{1,2}(:\d{2})?\s?(am|pm)?)\s*–\s*(\d{1,2}(:\d{2})?\s?(am|pm)?)', last_line, re.I)
-        if match:
-            start_time = match.group(1)
-            end_time = match.group(4)
-            start_end_times.append((start_time, end_time))
-
-            print(start_end_times)
-
-    my_start, my_end = normalize_event(original_start_time, original_end_time)
-
-    #start24h, end24h = convert_range_to_24h(f"{e_start_str} – {e_end_str}")
-
-    for e_start_str, e_end_str in start_end_times:
-        #e_start, e_end = normalize_event(start24h, end24h)
-        normalizedStart, normalizedEnd = (convert_range_to_24h(f"{e_start_str} – {e_end_str}"))
-        e_start, e_end = normalize_event(normalizedStart, normalizedEnd)
-    # Check for overlap
-        if not (my_end < e_start or my_start > e_end):
-            print(f"Conflict with event {e_start_str} – {e_end_str}")
-            print(f"time string {e_start_str} – {e_end_str}")
-            print(f"nomalized time {e_start} – {e_end}")
-            print(f"event time {my_start} – {my_end}")
-            print(f"input time {original_start_time} – {original_end_time}")
-            return True
-        else:
-            print(f"No conflict with event {e_start_str} – {e_end_str}")
-            return False      
+    Searches working hours (WORK_DAY_START-WORK_DAY_END) on the event's date
+    and the FREE_SLOT_DAYS - 1 days after it, stopping once enough slots are
+    found. indexes maps date -> ConflictIndex for days already scraped;
+    other days are loaded into it (see load_indexes). Returns event copies with the
+    new dates and times.
+    """
+    start, end = event_interval(event)[:2]
+    duration = end - start
+    window_start = time_to_minutes(WORK_DAY_START)
+    window_end = time_to_minutes(WORK_DAY_END)
+    indexes = {} if indexes is None else indexes
+
+    now = datetime.now()
+    first_day = datetime.strptime(event["start_date"], "%Y-%m-%d")
+    suggestions = []
+    with span("free_slot_search"):
+        for offset in range(FREE_SLOT_DAYS):
+            day = first_day + timedelta(days=offset)
+            date = day.strftime("%Y-%m-%d")
+            # Never suggest a slot that has already begun
+            earliest = window_start
+            if day.date() == now.date():
+                earliest = max(window_start, now.hour * 60 + now.minute)
+            elif day.date() < now.date():
+                continue
+            load_indexes(page, [date], indexes, store)
+            slots = nearest_free_slots(indexes[date], duration, start, earliest, window_end,
+                                       limit=FREE_SLOT_LIMIT - len(suggestions))
+            for slot_start, slot_end in slots:
+                suggestions.append(dict(
+                    event,
+                    start_date=date,
+                    end_date=date,
+                    start_time=minutes_to_hhmm(slot_start),
+                    end_time=minutes_to_hhmm(slot_end),
+                ))
+            if len(suggestions) >= FREE_SLOT_LIMIT:
+                break
+    tracing.debug("Suggested free slots", date=event["start_date"], start=event["start_time"], count=len(suggestions))
+    return suggestions
 
 
 def round_down_24h_to_pre_15mins(time_24h: str) -> str:
@@ -227,151 +322,331 @@ def round_up_24h_to_next_30mins(time_24h: str) -> str:
 
 def add_event_to_calendar(initial_event, recognized_text=None):
     """
-    Create a Google Calendar event, waiting for the frontend to send voice input if needed.
+    Create a Google Calendar event and return the add_event_on_page result.
+
+    Opens its own CDP connection and page; the API server uses a warm page from
+    browser_session.CalendarPagePool and calls add_event_on_page directly.
 
     Parameters:
         initial_event: dict with 'title', 'date', 'start_time', 'end_time'
         recognized_text: optional string from frontend speech recognition.
     """
-
-    global latest_recognized_text
-
     with sync_playwright() as p:
-        browser = p.chromium.connect_over_cdp(f"http://127.0.0.1:{DEBUG_PORT}")
+        with span("cdp_connect"):
+            browser = p.chromium.connect_over_cdp(f"http://127.0.0.1:{DEBUG_PORT}")
         context = browser.contexts[0]
         page = context.new_page()
-        page.goto("https://calendar.google.com", wait_until="load")
-        print("[DEBUG] Page title:", page.title())
+        goto(page, CALENDAR_BASE_URL)
+        tracing.debug("Calendar page opened", url=page.url)
+        return add_event_on_page(page, initial_event)
 
-        # Wait for manual login
-        while page.query_selector('input[type="email"]') or "accounts.google.com" in page.url:
-            speak_message("Google 登录已过期，请重新登录。")
-            print("[DEBUG] Waiting for user login...")
-            time.sleep(15)
-            page.goto("https://calendar.google.com")
 
-        print("[DEBUG] Logged in successfully, continuing to create event")
+def wait_for_login(page):
+    """
+    Return once page's browser is logged in to Google.
 
-        event = initial_event
+    Usually answered from the browser's cached LoginState without touching
+    the page. Otherwise the user is prompted (every LOGIN_PROMPT_COOLDOWN
+    seconds) and the wait ends as soon as the login shows up in the
+    browser's cookies; jobs waiting on other pages of the same browser are
+    woken together.
+    """
+    login = current_login_state()
+    if login.is_logged_in(page):
+        return
+    LOGIN_WAITS.inc()
+
+    with span("login_wait"):
         while True:
-            # Check if slot is occupied
-            occupied = is_slot_occupied(page, event['start_date'], event['start_time'], event['end_time'])
-    
-            if occupied:
-                msg = f"您在{event['start_date']} {event['start_time']}到{event['end_time']}已有日程安排，请在前端重新创造新日程。"
-                print("[WARN]", msg)
-                speak_message(msg)
-
-                #page.close()
-
-                # Wait for frontend to send new input
-                latest_recognized_text = None
-                print("[DEBUG] Waiting for frontend input...")
-        
-                while latest_recognized_text is None:
-                    time.sleep(1)  # wait until frontend sends new text
-
-                # Now we have valid input
-                event = parse_event(latest_recognized_text)
-                print("[DEBUG] New event data:", event)
-
-                # Continue loop to check if new slot is free
-                    
-            else:
-                page.locator('button:has-text("Create"), button:has-text("创建")').first.click()
-                page.wait_for_timeout(300)
-                print("Create clicked")
-
-                 # Click "Event" (English or Chinese)
-                event_locator = page.locator('div:has-text("Event"), div:has-text("事件")').first
-                event_locator.wait_for(state="visible", timeout=5000)
-                event_locator.click()
-
-                print("Clicked 'Event' successfully!")
-
-                page.fill('input[aria-label="Add title"], input[aria-label="添加标题"]', event["title"])
-                print("title filled")
-
-                page.locator('button:has-text("More options")').first.click()
-                page.wait_for_timeout(300)
-                print("More options clicked")
-
-                print("date is: ", event["start_date"])
-
-                page.get_by_label("Start date").click()
-                # Suppose event["date"] = "2025-12-31"
-                date_obj = datetime.strptime(event["start_date"], "%Y-%m-%d")
-                date_str = date_obj.strftime("%Y%m%d")
-                print(date_str)
-               
-                # select the td representing the date
-                day_cell = page.locator(f'td[data-date="{date_str}"]:not([data-dragsource-type])')
-
-                # wait until visible, scroll if needed
-                day_cell.wait_for(state="visible")
-                day_cell.scroll_into_view_if_needed()
-
-                # click it
-                day_cell.click()
-
-
-
-                print("day selected")
-
-                # # Get the Start time combobox input and click it
-                start_time_input = page.get_by_role("combobox", name="Start time")
-                start_time_input.click()
-
-                start_time = round_down_24h_to_pre_15mins(event["start_time"])
-                print(start_time)
-                page.get_by_role("option", name=start_time, exact=True).click()
-
-                end_time_input = page.get_by_role("combobox", name="End time")
-                end_time_input.click()
-                end_time = round_up_24h_to_next_30mins(event["end_time"])
-                
-                print(event["end_time"])
-                print(end_time)
-                option_locator = page.get_by_role("option", name=end_time)
-
-                try:
-                    option_locator.click()
-                except:
-                # 找不到就往上滚动找下一个可选时间
-                    all_options = page.get_by_label("End date").click()
-                    count = all_options.count()
-                    chosen = False
-                    for i in range(count):
-                        text = all_options.nth(i).inner_text().strip()
-                    if text > end_time:  # 向上取整选择
-                        all_options.nth(i).click()
-                        chosen = True
-                        break
-                    if not chosen:
-                        # 兜底：选择最后一个 option
-                        all_options.nth(count-1).click()
-
-                #page.get_by_label("End date").click()
-                # Suppose event["date"] = "2025-12-31"
-                # date_obj 是开始日期
-                date_obj2 = datetime.strptime(event["end_date"], "%Y-%m-%d")
-                # if event["start_time"] > event["end_time"]:
-                #     end_date_obj = date_obj2 + timedelta(days=1)  # 增加一天
-                # else:
-                #     end_date_obj = date_obj2
-
-                date_str2 = date_obj2.strftime("%Y%m%d")  
-
-                print("end date is ", date_str2)
-
-                page.get_by_label("End date").click()
-
-                page.get_by_role("gridcell", name=f"{date_obj2.day}, {date_obj2.strftime('%A')}").click()
-
-                #page.get_by_role("gridcell", name=day_str2).filter(has_text=month_name).click()
-                print("day selected")
-
-                page.locator('button:has-text("Save")').first.click()
+            speak_message(LOGIN_EXPIRED_MESSAGE, priority=PRIORITY_HIGH, cooldown=LOGIN_PROMPT_COOLDOWN)
+            tracing.info("Waiting for user login")
+            if login.await_login(page, LOGIN_PROMPT_COOLDOWN):
                 break
 
+    if not page.url.startswith(CALENDAR_BASE_URL):
+        goto(page, CALENDAR_BASE_URL)
+
+
+def _report(on_progress, stage):
+    if on_progress is not None:
+        on_progress(stage)
+
 
+def prefetch_days(page, date, store=None):
+    """
+    Speculatively load the days around date (see load_indexes).
+
+    Runs while the user is still speaking, so it never stops for a login:
+    a logged-out page just yields nothing.
+    """
+    if not current_login_state().is_logged_in(page):
+        return {}
+    with span("prefetch"):
+        return load_indexes(page, [date], store=store)
+
+
+def add_event_on_page(page, event, on_progress=None, create_mode=CREATE_MODE_URL, indexes=None, store=None):
+    """
+    Create a Google Calendar event on an already opened calendar page.
+
+    on_progress, if given, is called with the job stage name
+    (checking_conflicts, creating) as the flow advances. create_mode picks
+    the creation path, see create_event. indexes (date -> ConflictIndex)
+    may hold days prefetched earlier; only missing days are loaded, from
+    store when it has them fresh (see load_indexes). A created event is
+    written through to store.
+
+    Returns {"status": "created", "event"} or, when the slot is taken,
+    {"status": "conflict", "event", "conflicts"} without creating anything;
+    asking the user for another time is up to the caller.
+    """
+    wait_for_login(page)
+
+    # Check if slot is occupied
+    _report(on_progress, CHECKING_CONFLICTS)
+    indexes = {} if indexes is None else indexes
+    try:
+        conflicts = find_conflicts(page, event, indexes, store)
+    except LoginRequired:
+        wait_for_login(page)
+        conflicts = find_conflicts(page, event, indexes, store)
+
+    if conflicts:
+        # The frontend plays conflict_message() and records a new time or lets the user pick a suggestion
+        tracing.warn("Event conflicts", date=event["start_date"], start=event["start_time"], end=event["end_time"])
+        return {
+            "status": "conflict",
+            "event": event,
+            "conflicts": [interval_to_dict(c) for c in conflicts],
+            "suggestions": suggest_free_slots(page, event, indexes, store),
+        }
+
+    _report(on_progress, CREATING)
+    create_event(page, event, create_mode)
+    if store is not None:
+        store.add_event(event)
+    return {"status": "created", "event": event}
+
+
+def create_suggested_event(page, event, on_progress=None, create_mode=CREATE_MODE_URL, indexes=None, store=None):
+    """
+    Create an accepted free-slot suggestion.
+
+    The job held no date locks while the user was choosing, so the slot is
+    checked again (usually from store, without navigating) and comes back
+    as a conflict like add_event_on_page's if it was booked meanwhile.
+    """
+    return add_event_on_page(page, event, on_progress, create_mode, indexes, store)
+
+
+def add_events_on_page(page, events, create_mode=CREATE_MODE_URL, store=None):
+    """
+    Create several parsed events on one page.
+
+    Every date the batch touches is loaded up front (one week view covers
+    seven days, see load_indexes) and events are handled by start_date;
+    events created earlier in the batch count as busy for later ones.
+    Returns one {"status", "event", ...} dict per input event, in order.
+    """
+    wait_for_login(page)
+
+    by_date = {}
+    for i, event in enumerate(events):
+        by_date.setdefault(event["start_date"], []).append(i)
+
+    results = [None] * len(events)
+    indexes = load_indexes(page, [d for event in events for d in event_dates(event)], store=store)
+    for date, indices in by_date.items():
+        for i in indices:
+            event = events[i]
+            conflicts = event_conflicts(indexes, event)
+            if conflicts:
+                CONFLICTS.inc()
+                tracing.warn("Batch item conflicts", item=i, conflicts=len(conflicts))
+                results[i] = {
+                    "status": "conflict",
+                    "event": event,
+                    "conflicts": [interval_to_dict(c) for c in conflicts],
+                }
+                continue
+            try:
+                create_event(page, event, create_mode)
+            except Exception as e:
+                tracing.error("Batch item failed", item=i, error=repr(e))
+                results[i] = {"status": "failed", "event": event, "error": str(e)}
+            else:
+                add_busy_event(indexes, event)
+                if store is not None:
+                    store.add_event(event)
+                results[i] = {"status": "created", "event": event}
+
+    # Suggest alternatives once the whole batch is in, reusing the scraped days
+    for result in results:
+        if result["status"] == "conflict":
+            result["suggestions"] = suggest_free_slots(page, result["event"], indexes, store)
+    return results
+
+
+def build_event_edit_url(event):
+    """
+    Prefilled Google Calendar event-edit URL for a parsed event.
+
+    dates carries the exact start/end as local wall-clock times
+    (YYYYMMDDTHHMMSS/YYYYMMDDTHHMMSS), so no 15/30-minute rounding applies.
+    """
+    start = datetime.strptime(f"{event['start_date']} {event['start_time']}", "%Y-%m-%d %H:%M")
+    end = datetime.strptime(f"{event['end_date']} {event['end_time']}", "%Y-%m-%d %H:%M")
+    params = {
+        "text": event["title"],
+        "dates": f"{start:%Y%m%dT%H%M%S}/{end:%Y%m%dT%H%M%S}",
+        "details": event.get("description", ""),
+    }
+    return f"{EVENT_EDIT_URL}?{urlencode(params, safe='/')}"
+
+
+def open_event_edit(page, event):
+    """Open the prefilled event-edit page and return its Save button once it shows."""
+    with span("url_navigation"):
+        goto(page, build_event_edit_url(event), step="event_edit")
+        return wait_visible("edit_page", page.locator('button:has-text("Save"), button:has-text("保存")').first)
+
+
+def create_event_via_url(page, event, save=None):
+    """Open the prefilled event-edit page (unless save is already its Save button) and only click Save."""
+    if save is None:
+        save = open_event_edit(page, event)
+
+    with span("save_click"):
+        save.click()
+        # Google Calendar leaves the edit page once the event is stored
+        wait_for_url(page, "save", lambda url: "eventedit" not in url)
+    tracing.debug("Event saved via prefilled URL")
+
+
+def create_event(page, event, mode=CREATE_MODE_URL):
+    """
+    Create event on page.
+
+    The url mode opens a prefilled edit page and saves it; if the edit page
+    does not come up the multi-step form flow is used instead. Once Save was
+    clicked the event may already exist, so later failures are raised rather
+    than retried through the form. The form mode goes straight to the form
+    flow.
+    """
+    if mode == CREATE_MODE_URL:
+        try:
+            save = open_event_edit(page, event)
+        except Exception as e:
+            tracing.warn("Prefilled edit page unavailable, falling back to the form", error=repr(e))
+            CREATE_MODE_FALLBACKS.inc()
+            goto(page, CALENDAR_BASE_URL)
+        else:
+            create_event_via_url(page, event, save)
+            return
+    create_event_via_form(page, event)
+
+
+def create_event_via_form(page, event):
+    """
+    Fill in and save the Google Calendar event form for event on page.
+    """
+    with span("form_create_click"):
+        page.locator('button:has-text("Create"), button:has-text("创建")').first.click()
+    tracing.debug("Form: create clicked")
+
+    # Click "Event" (English or Chinese) once the menu is open
+    with span("form_event_menu"):
+        event_locator = page.locator('div:has-text("Event"), div:has-text("事件")').first
+        wait_visible("event_menu", event_locator).click()
+
+    tracing.debug("Form: event menu clicked")
+
+    with span("form_title"):
+        title_input = page.locator('input[aria-label="Add title"], input[aria-label="添加标题"]').first
+        wait_visible("quick_dialog", title_input).fill(event["title"])
+    tracing.debug("Form: title filled")
+
+    with span("form_more_options"):
+        page.locator('button:has-text("More options")').first.click()
+        wait_visible("editor", page.get_by_label("Start date"))
+    tracing.debug("Form: more options clicked")
+
+    with span("form_start_date"):
+        page.get_by_label("Start date").click()
+        # Suppose event["date"] = "2025-12-31"
+        date_obj = datetime.strptime(event["start_date"], "%Y-%m-%d")
+        date_str = date_obj.strftime("%Y%m%d")
+
+        # select the td representing the date
+        day_cell = page.locator(f'td[data-date="{date_str}"]:not([data-dragsource-type])')
+
+        # wait until the picker shows it, scroll if needed
+        wait_visible("date_picker", day_cell)
+        day_cell.scroll_into_view_if_needed()
+
+        # click it
+        day_cell.click()
+
+    tracing.debug("Form: start date selected", date=event["start_date"])
+
+    # # Get the Start time combobox input and click it
+    with span("form_start_time"):
+        start_time_input = page.get_by_role("combobox", name="Start time")
+        start_time_input.click()
+        wait_for_options(page)
+
+        start_time = round_down_24h_to_pre_15mins(event["start_time"])
+        tracing.debug("Form: start time", time=event["start_time"], option=start_time)
+        page.get_by_role("option", name=start_time, exact=True).click()
+
+    with span("form_end_time"):
+        end_time_input = page.get_by_role("combobox", name="End time")
+        end_time_input.click()
+        wait_for_options(page)
+        end_time = round_up_24h_to_next_30mins(event["end_time"])
+
+        tracing.debug("Form: end time", time=event["end_time"], option=end_time)
+        option_locator = page.get_by_role("option", name=end_time)
+
+        try:
+            option_locator.click()
+        except Exception:
+            # 找不到就往上滚动找下一个可选时间
+            FALLBACK_OPTION_PICKS.inc()
+            all_options = page.get_by_role("option")
+            count = all_options.count()
+            target = time_to_minutes(end_time)
+            chosen = False
+            for i in range(count):
+                text = all_options.nth(i).inner_text().strip()
+                if time_to_minutes(text.split("(")[0]) >= target:  # 向上取整选择
+                    all_options.nth(i).click()
+                    chosen = True
+                    break
+            if not chosen:
+                # 兜底：选择最后一个 option
+                all_options.nth(count-1).click()
+
+    #page.get_by_label("End date").click()
+    # Suppose event["date"] = "2025-12-31"
+    # date_obj 是开始日期
+    date_obj2 = datetime.strptime(event["end_date"], "%Y-%m-%d")
+    # if event["start_time"] > event["end_time"]:
+    #     end_date_obj = date_obj2 + timedelta(days=1)  # 增加一天
+    # else:
+    #     end_date_obj = date_obj2
+
+    with span("form_end_date"):
+        page.get_by_label("End date").click()
+
+        day_cell2 = page.get_by_role("gridcell", name=f"{date_obj2.day}, {date_obj2.strftime('%A')}")
+        wait_visible("date_picker", day_cell2).click()
+
+    #page.get_by_role("gridcell", name=day_str2).filter(has_text=month_name).click()
+    tracing.debug("Form: end date selected", date=event["end_date"])
+
+    with span("save_click"):
+        save = page.locator('button:has-text("Save")').first
+        save.click()
+        # The editor closes (or navigates away) once the event is stored
+        wait_hidden("form_save", save)
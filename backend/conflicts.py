@@ -0,0 +1,297 @@
+import bisect
+import re
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+import tracing
+from time_utils import normalize_event, convert_range_to_24h
+
+DAY_MINUTES = 24 * 60
+
+# Google Calendar event buttons end with a line like '2:30 – 3:30am'
+EVENT_RANGE_RE = re.compile(
+    r'(\d{1,2}(:\d{2})?\s?(am|pm)?)\s*–\s*(\d{1,2}(:\d{2})?\s?(am|pm)?)', re.I
+)
+
+# start / end are minutes since midnight; end may exceed 1440 for overnight events
+Interval = namedtuple("Interval", ["start", "end", "text"])
+
+
+def parse_button_texts(texts):
+    """
+    Turn scraped event button texts into Intervals.
+
+    Only buttons whose text contains "to" are event chips (same filter as the
+    scraper always used); the time range is read from the last line.
+    Unparseable ranges are skipped.
+    """
+    intervals = []
+    for text in texts:
+        if "to" not in text:
+            continue
+        last_line = text.strip().split("\n")[-1]
+        m = EVENT_RANGE_RE.search(last_line)
+        if not m:
+            continue
+        try:
+            start_24, end_24 = convert_range_to_24h(f"{m.group(1)} – {m.group(4)}")
+        except ValueError as e:
+            tracing.warn("Skipping event with unreadable time range", error=str(e))
+            continue
+        start, end = normalize_event(start_24, end_24)
+        intervals.append(Interval(start, end, text))
+    return intervals
+
+
+def event_interval(event):
+    """Interval for a parsed event dict (nlu.parse_event output)."""
+    start, end = normalize_event(event["start_time"], event["end_time"])
+    return Interval(start, end, event["title"])
+
+
+def minutes_to_hhmm(minutes):
+    minutes %= DAY_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def interval_to_dict(interval):
+    return {
+        "start_time": minutes_to_hhmm(interval.start),
+        "end_time": minutes_to_hhmm(interval.end),
+        "text": interval.text.strip(),
+    }
+
+
+# -------------------------
+# 区间索引
+# -------------------------
+class ConflictIndex:
+    """
+    Sorted interval index over one day's busy events.
+
+    Intervals are kept sorted by start with a running maximum of their ends,
+    so "is anything overlapping?" is one binary search and listing every
+    conflict costs O(log n + scanned). Overlap is half-open: an event ending
+    at 10:00 does not conflict with one starting at 10:00.
+
+    The day view shows overnight events both on the day they start and on
+    the day they end, and the scraped text does not say which one we are
+    looking at, so an overnight event is also indexed shifted back by a day.
+    Pass shift_overnight=False when the intervals are already placed on the
+    right day (see week_intervals).
+    """
+
+    def __init__(self, intervals=(), shift_overnight=True):
+        self._items = []
+        self._count = 0
+        self._shift_overnight = shift_overnight
+        for interval in intervals:
+            self._insert(interval)
+        self._rebuild()
+
+    @classmethod
+    def from_button_texts(cls, texts):
+        return cls(parse_button_texts(texts))
+
+    def __len__(self):
+        return self._count
+
+    def add(self, interval):
+        self._insert(interval)
+        self._rebuild()
+
+    def placed(self):
+        """Intervals as indexed (overnight ones also shifted back a day); rebuild with shift_overnight=False."""
+        return [interval._replace(start=start, end=end) for start, end, interval in self._items]
+
+    def _insert(self, interval):
+        self._count += 1
+        self._items.append((interval.start, interval.end, interval))
+        if self._shift_overnight and interval.end > DAY_MINUTES:
+            self._items.append((interval.start - DAY_MINUTES, interval.end - DAY_MINUTES, interval))
+
+    def _rebuild(self):
+        self._items.sort(key=lambda item: (item[0], item[1]))
+        self._starts = [item[0] for item in self._items]
+        self._max_end = []
+        running = None
+        for _, end, _ in self._items:
+            running = end if running is None else max(running, end)
+            self._max_end.append(running)
+
+    # ---------- queries ----------
+    def _span(self, start, end):
+        if isinstance(start, str):
+            start, end = normalize_event(start, end)
+        return start, end
+
+    def has_conflict(self, start, end):
+        start, end = self._span(start, end)
+        hi = bisect.bisect_left(self._starts, end)
+        return hi > 0 and self._max_end[hi - 1] > start
+
+    def conflicts(self, start, end):
+        """
+        Every indexed event overlapping [start, end), ordered by start.
+
+        start / end are 'HH:MM' strings or minutes since midnight.
+        """
+        start, end = self._span(start, end)
+        hi = bisect.bisect_left(self._starts, end)
+        found = []
+        seen = set()
+        i = hi - 1
+        while i >= 0 and self._max_end[i] > start:
+            _, item_end, interval = self._items[i]
+            if item_end > start and id(interval) not in seen:
+                seen.add(id(interval))
+                found.append(interval)
+            i -= 1
+        found.reverse()
+        return found
+
+    def conflicts_batch(self, slots):
+        """Run conflicts() for many (start, end) candidate slots at once."""
+        return [self.conflicts(start, end) for start, end in slots]
+
+    def merged_busy(self):
+        """Busy time as sorted, non-overlapping (start, end) minute ranges."""
+        merged = []
+        for start, end, _ in self._items:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [(start, end) for start, end in merged]
+
+    def free_gaps(self, window_start, window_end):
+        """Free (start, end) ranges inside [window_start, window_end)."""
+        gaps = []
+        cursor = window_start
+        for start, end in self.merged_busy():
+            if end <= cursor:
+                continue
+            if start >= window_end:
+                break
+            if start > cursor:
+                gaps.append((cursor, start))
+            cursor = max(cursor, end)
+        if cursor < window_end:
+            gaps.append((cursor, window_end))
+        return gaps
+
+
+# -------------------------
+# 周视图
+# -------------------------
+def decode_datekey(key):
+    """Week view columns carry data-datekey = ((year - 1970) << 9) | (month << 5) | day."""
+    key = int(key)
+    return f"{(key >> 9) + 1970:04d}-{(key >> 5) & 0xF:02d}-{key & 0x1F:02d}"
+
+
+def next_date(date):
+    return (datetime.strptime(date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def week_intervals(columns):
+    """
+    Per-date Intervals from week view columns ({date: [Interval]}).
+
+    The week view draws a timed overnight event in the column it starts in
+    and again in the next one. Knowing the columns removes the day view's
+    guesswork: a chip that started in the previous column is a continuation
+    and only its after-midnight part counts on this day, every other chip
+    starts on its own day. For the first column the previous day is not on
+    the page, so both readings are kept.
+    """
+    result = {}
+    previous_date = None
+    started_before = Counter()
+    for date in sorted(columns):
+        known = previous_date is not None and next_date(previous_date) == date
+        intervals = []
+        started_here = Counter()
+        for interval in columns[date]:
+            if interval.end <= DAY_MINUTES:
+                intervals.append(interval)
+                continue
+            continuation = interval._replace(start=interval.start - DAY_MINUTES, end=interval.end - DAY_MINUTES)
+            if known and started_before[interval.text] > 0:
+                started_before[interval.text] -= 1
+                intervals.append(continuation)
+                continue
+            intervals.append(interval)
+            started_here[interval.text] += 1
+            if not known:
+                intervals.append(continuation)
+        result[date] = intervals
+        previous_date = date
+        started_before = started_here
+    return result
+
+
+def week_indexes(columns):
+    """date -> ConflictIndex for every column of a scraped week view."""
+    return {
+        date: ConflictIndex(intervals, shift_overnight=False)
+        for date, intervals in week_intervals(columns).items()
+    }
+
+
+def event_conflicts(indexes, event):
+    """
+    Busy intervals overlapping a parsed event; indexes maps date -> ConflictIndex.
+
+    An event running past midnight is checked on its start day and, for the
+    part after midnight, on the next day too.
+    """
+    start, end = event_interval(event)[:2]
+    found = indexes[event["start_date"]].conflicts(start, end)
+    if end > DAY_MINUTES:
+        seen = {c.text for c in found}
+        for c in indexes[next_date(event["start_date"])].conflicts(0, end - DAY_MINUTES):
+            if c.text not in seen:
+                seen.add(c.text)
+                found.append(c)
+    return found
+
+
+def add_busy_event(indexes, event):
+    """Count a just-created event as busy on every indexed day it touches."""
+    interval = event_interval(event)
+    indexes[event["start_date"]].add(interval)
+    following = next_date(event["start_date"])
+    if interval.end > DAY_MINUTES and following in indexes:
+        indexes[following].add(interval._replace(start=interval.start - DAY_MINUTES, end=interval.end - DAY_MINUTES))
+
+
+def event_dates(event):
+    """Dates whose busy events an event has to be checked against."""
+    start, end = event_interval(event)[:2]
+    if end > DAY_MINUTES:
+        return [event["start_date"], next_date(event["start_date"])]
+    return [event["start_date"]]
+
+
+# -------------------------
+# 空闲时段
+# -------------------------
+def nearest_free_slots(index, duration, target, window_start, window_end, step=15, limit=3):
+    """
+    Open (start, end) slots of duration minutes inside the window, nearest to target first.
+
+    Each free gap offers one slot: the step-aligned start closest to target
+    that still fits in the gap.
+    """
+    aligned_target = round(target / step) * step
+    candidates = []
+    for gap_start, gap_end in index.free_gaps(window_start, window_end):
+        first = -(-gap_start // step) * step
+        last = (gap_end - duration) // step * step
+        if first > last:
+            continue
+        start = min(max(aligned_target, first), last)
+        candidates.append((abs(start - target), start))
+    candidates.sort()
+    return [(start, start + duration) for _, start in candidates[:limit]]
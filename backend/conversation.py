@@ -0,0 +1,136 @@
+import heapq
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+
+import tracing
+
+
+class ReplyTimeout(Exception):
+    pass
+
+
+class _Pending:
+    def __init__(self, session_id, job, deadline):
+        self.session_id = session_id
+        self.job = job
+        self.deadline = deadline
+        self.future = Future()
+
+
+# -------------------------
+# 会话管理：冲突后等待用户重新说出时间
+# -------------------------
+class ConversationManager:
+    """
+    Follow-up questions parked per session.
+
+    park() registers a job that needs another utterance and returns a Future;
+    no thread waits on it. reply() resolves the session's future with the
+    answer (new text, or a chosen suggestion), cancel() cancels it and a single reaper thread fails it with
+    ReplyTimeout once its deadline passes. Whoever parked the job reacts in a
+    done-callback (e.g. by putting the job back on the scheduler).
+
+    A session has at most one open question: parking again cancels the
+    previous one.
+    """
+
+    def __init__(self, timeout=120):
+        self.timeout = timeout
+        self._pending = {}
+        self._deadlines = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="conversation-reaper", daemon=True)
+        self._thread.start()
+
+    def park(self, session_id, job, timeout=None):
+        pending = _Pending(session_id, job, time.monotonic() + (timeout or self.timeout))
+        with self._cond:
+            previous = self._pending.get(session_id)
+            self._pending[session_id] = pending
+            heapq.heappush(self._deadlines, (pending.deadline, id(pending), pending))
+            self._cond.notify()
+        if previous is not None:
+            previous.future.cancel()
+        pending.future.add_done_callback(lambda _f: self._forget(pending))
+        return pending.future
+
+    def waiting_job(self, session_id):
+        with self._cond:
+            pending = self._pending.get(session_id)
+        return pending.job if pending is not None else None
+
+    def reply(self, session_id, answer):
+        """Hand answer to the session's open question; returns its job or None."""
+        pending = self._take(session_id)
+        if pending is None or not pending.future.set_running_or_notify_cancel():
+            return None
+        pending.future.set_result(answer)
+        return pending.job
+
+    def cancel(self, session_id):
+        pending = self._take(session_id)
+        return pending is not None and pending.future.cancel()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            pendings = list(self._pending.values())
+            self._cond.notify()
+        for pending in pendings:
+            pending.future.cancel()
+
+    def _take(self, session_id):
+        with self._cond:
+            return self._pending.pop(session_id, None)
+
+    def _forget(self, pending):
+        with self._cond:
+            if self._pending.get(pending.session_id) is pending:
+                del self._pending[pending.session_id]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    # Skip entries that were answered or cancelled meanwhile
+                    while self._deadlines and self._deadlines[0][2].future.done():
+                        heapq.heappop(self._deadlines)
+                    if not self._deadlines:
+                        self._cond.wait()
+                        continue
+                    delay = self._deadlines[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                if self._closed:
+                    return
+                _, _, pending = heapq.heappop(self._deadlines)
+                # Only expire questions nobody has taken (answered or cancelled) yet
+                owned = self._pending.get(pending.session_id) is pending
+                if owned:
+                    del self._pending[pending.session_id]
+            if owned and pending.future.set_running_or_notify_cancel():
+                with tracing.request_context(pending.job.id):
+                    tracing.warn("No reply within the timeout", session=pending.session_id)
+                pending.future.set_exception(ReplyTimeout("no reply within the timeout"))
+
+
+def reply_outcome(future):
+    """("reply", answer), ("timeout", None) or ("cancelled", None) for a finished future."""
+    try:
+        return "reply", future.result()
+    except CancelledError:
+        return "cancelled", None
+    except ReplyTimeout:
+        return "timeout", None
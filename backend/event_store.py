@@ -0,0 +1,239 @@
+"""
+Local SQLite mirror of the calendar's busy events, per account and day.
+
+    python event_store.py export events.json
+    python event_store.py import events.json
+
+Scraped days are saved with the time they were scraped and events created
+through the app are written through, so a conflict check can use a day
+from the store instead of loading it again while it is younger than the
+staleness bound. Export / import move the mirror between machines or
+restore it for a warm start.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from accounts import DEFAULT_ACCOUNT
+from conflicts import ConflictIndex, Interval, DAY_MINUTES, event_interval, next_date
+
+EXPORT_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS days (
+    account TEXT NOT NULL,
+    date TEXT NOT NULL,
+    scraped_at REAL NOT NULL,
+    PRIMARY KEY (account, date)
+);
+CREATE TABLE IF NOT EXISTS events (
+    account TEXT NOT NULL,
+    date TEXT NOT NULL,
+    start_minute INTEGER NOT NULL,
+    end_minute INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    source TEXT NOT NULL,
+    added_at REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS events_by_day ON events (account, date, start_minute, end_minute);
+"""
+
+SOURCE_SCRAPED = "scraped"
+SOURCE_CREATED = "created"
+
+
+# -------------------------
+# 本地日程库
+# -------------------------
+class EventStore:
+    """
+    Busy intervals per (account, date) with a per-day scrape timestamp.
+
+    A scrape is saved with the time it started. Events created through the
+    app after that time survive the save, since the scrape may have missed
+    them (a week view also covers days whose locks the scraping job does
+    not hold), and a scrape older than the stored one is ignored.
+
+    Intervals are stored as placed in a ConflictIndex (start / end minutes
+    of that day, possibly below 0 or past 1440 around midnight), so a day
+    comes back as ConflictIndex(rows, shift_overnight=False). A day is
+    fresh while it was scraped less than max_age seconds ago; max_age 0
+    turns reads off while still recording everything.
+    """
+
+    def __init__(self, path, max_age=300):
+        self.path = path
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(events)")]
+        if "added_at" not in columns:
+            # Stores written before created rows were timestamped
+            self._db.execute("ALTER TABLE events ADD COLUMN added_at REAL NOT NULL DEFAULT 0")
+        self._lock = threading.Lock()
+
+    def account(self, account_id):
+        """The store as seen by one account (what calendar_bot gets)."""
+        return AccountEvents(self, account_id or DEFAULT_ACCOUNT)
+
+    # ---------- reads ----------
+    def fresh_day(self, account, date, now=None):
+        """ConflictIndex for date if it was scraped within max_age seconds, else None."""
+        if self.max_age <= 0:
+            return None
+        now = now or time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT scraped_at FROM days WHERE account = ? AND date = ?", (account, date)
+            ).fetchone()
+            if row is None or now - row[0] > self.max_age:
+                self.misses += 1
+                return None
+            rows = self._db.execute(
+                "SELECT start_minute, end_minute, text FROM events WHERE account = ? AND date = ?"
+                " ORDER BY start_minute, end_minute",
+                (account, date),
+            ).fetchall()
+            self.hits += 1
+        return ConflictIndex([Interval(*r) for r in rows], shift_overnight=False)
+
+    # ---------- writes ----------
+    def save_day(self, account, date, index, scraped_at=None):
+        """Replace date's events with a ConflictIndex scraped starting at scraped_at."""
+        scraped_at = scraped_at or time.time()
+        rows = [(account, date, i.start, i.end, i.text, SOURCE_SCRAPED, scraped_at) for i in index.placed()]
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT scraped_at FROM days WHERE account = ? AND date = ?", (account, date)
+            ).fetchone()
+            if row is not None and row[0] > scraped_at:
+                # A newer scrape already replaced this day
+                return
+            self._replace_day(account, date, scraped_at, rows)
+
+    def _replace_day(self, account, date, scraped_at, rows):
+        # Called with self._lock held inside a transaction; events created after scraped_at are kept
+        self._db.execute(
+            "DELETE FROM events WHERE account = ? AND date = ? AND (source != ? OR added_at <= ?)",
+            (account, date, SOURCE_CREATED, scraped_at),
+        )
+        self._db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self._db.execute(
+            "INSERT OR REPLACE INTO days (account, date, scraped_at) VALUES (?, ?, ?)",
+            (account, date, scraped_at),
+        )
+
+    def add_event(self, account, event):
+        """Write a just-created event through, on every day it touches."""
+        interval = event_interval(event)
+        now = time.time()
+        rows = [(account, event["start_date"], interval.start, interval.end, interval.text, SOURCE_CREATED, now)]
+        if interval.end > DAY_MINUTES:
+            rows.append((account, next_date(event["start_date"]), interval.start - DAY_MINUTES,
+                         interval.end - DAY_MINUTES, interval.text, SOURCE_CREATED, now))
+        with self._lock, self._db:
+            self._db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    # ---------- bulk ----------
+    def export(self, account=None):
+        """Every stored day (of one account, or all) as a JSON-ready dict."""
+        where, args = ("WHERE account = ?", (account,)) if account else ("", ())
+        with self._lock:
+            days = self._db.execute(f"SELECT account, date, scraped_at FROM days {where} ORDER BY account, date", args).fetchall()
+            rows = self._db.execute(
+                f"SELECT account, date, start_minute, end_minute, text, source FROM events {where}"
+                " ORDER BY account, date, start_minute", args
+            ).fetchall()
+        events = {}
+        for acc, date, start, end, text, source in rows:
+            events.setdefault((acc, date), []).append({"start": start, "end": end, "text": text, "source": source})
+        return {
+            "version": EXPORT_VERSION,
+            "days": [
+                {"account": acc, "date": date, "scraped_at": scraped_at, "events": events.get((acc, date), [])}
+                for acc, date, scraped_at in days
+            ],
+        }
+
+    def import_days(self, data):
+        """Load an export(); a day is only replaced by a more recent scrape of it. Returns days written."""
+        if data.get("version") != EXPORT_VERSION:
+            raise ValueError(f"unsupported export version {data.get('version')!r}")
+        written = 0
+        with self._lock, self._db:
+            for day in data["days"]:
+                row = self._db.execute(
+                    "SELECT scraped_at FROM days WHERE account = ? AND date = ?", (day["account"], day["date"])
+                ).fetchone()
+                if row is not None and row[0] >= day["scraped_at"]:
+                    continue
+                rows = [
+                    (day["account"], day["date"], e["start"], e["end"], e["text"], e.get("source", SOURCE_SCRAPED),
+                     day["scraped_at"])
+                    for e in day["events"]
+                ]
+                self._replace_day(day["account"], day["date"], day["scraped_at"], rows)
+                written += 1
+        return written
+
+    def stats(self):
+        with self._lock:
+            days = self._db.execute("SELECT COUNT(*) FROM days").fetchone()[0]
+            events = self._db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        return {"days": days, "events": events, "hits": self.hits, "misses": self.misses, "max_age": self.max_age}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class AccountEvents:
+    """EventStore bound to one account; calendar_bot only sees this."""
+
+    def __init__(self, store, account):
+        self.store = store
+        self.account = account
+
+    def fresh_day(self, date):
+        return self.store.fresh_day(self.account, date)
+
+    def save_day(self, date, index, scraped_at=None):
+        self.store.save_day(self.account, date, index, scraped_at)
+
+    def add_event(self, event):
+        self.store.add_event(self.account, event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import the local event store.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("file", help="JSON file to write (export) or read (import)")
+    parser.add_argument("--db", default=os.getenv("EVENT_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "event_store.sqlite3")))
+    parser.add_argument("--account", default=None, help="export only this account")
+    args = parser.parse_args()
+
+    store = EventStore(args.db)
+    try:
+        if args.command == "export":
+            data = store.export(args.account)
+            with open(args.file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            print(f"Exported {len(data['days'])} days to {args.file}")
+        else:
+            with open(args.file, encoding="utf-8") as f:
+                data = json.load(f)
+            print(f"Imported {store.import_days(data)} of {len(data['days'])} days from {args.file}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+"""
+Local stand-in for the parts of Google Calendar that calendar_bot drives.
+
+    python fake_calendar.py --port 8900 --latency 0.2 --density 8
+    CALENDAR_BASE_URL=http://127.0.0.1:8900 uvicorn main:app
+
+It reproduces the DOM contract the bot depends on: day views with a
+[role="grid"] of event buttons whose text has a "to" line and an en-dash
+time range, week views whose grid has one [data-datekey] column per day
+(overnight events drawn in both columns they touch), the Create button and Event menu item, the quick-add title
+input and More options button, labelled Start/End date pickers with
+td[data-date] and gridcell days, Start/End time comboboxes with options,
+the Save button, and the prefilled eventedit page. Every response is
+delayed by a configurable latency, and each day is seeded with a
+deterministic number of busy events.
+"""
+import argparse
+import asyncio
+import html
+import json
+import random
+import threading
+from datetime import date, datetime, timedelta
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, RedirectResponse
+from pydantic import BaseModel
+
+DEFAULT_LATENCY = 0.0
+DEFAULT_JITTER = 0.0
+DEFAULT_DENSITY = 6
+
+
+class EventIn(BaseModel):
+    title: str
+    start_date: str
+    start_time: str
+    end_date: str
+    end_time: str
+    description: str = ""
+
+
+# -------------------------
+# 日程数据
+# -------------------------
+class FakeCalendarStore:
+    """In-memory events per date; untouched days are seeded on first access."""
+
+    def __init__(self, density=DEFAULT_DENSITY, seed=0):
+        self.density = density
+        self.seed = seed
+        self.created = 0
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def _seed_day(self, day):
+        rng = random.Random(f"{self.seed}:{day}")
+        events = []
+        for i in range(self.density):
+            start = rng.randrange(7 * 4, 21 * 4) * 15
+            length = rng.choice([30, 45, 60, 90, 120])
+            events.append({
+                "title": f"Busy {i + 1}",
+                "start": start,
+                "end": start + length,
+            })
+        return events
+
+    def events(self, day):
+        with self._lock:
+            if day not in self._days:
+                self._days[day] = self._seed_day(day)
+            return list(self._days[day])
+
+    def add(self, event):
+        start = _hhmm_to_minutes(event.start_time)
+        end = _hhmm_to_minutes(event.end_time)
+        if event.end_date != event.start_date:
+            end += 24 * 60
+        self.events(event.start_date)
+        with self._lock:
+            self._days[event.start_date].append({"title": event.title, "start": start, "end": end})
+            self.created += 1
+
+
+def datekey(day):
+    """Google's week view column key: ((year - 1970) << 9) | (month << 5) | day."""
+    return ((day.year - 1970) << 9) | (day.month << 5) | day.day
+
+
+def _hhmm_to_minutes(text):
+    hour, minute = text.split(":")
+    return int(hour) * 60 + int(minute)
+
+
+def _clock(minutes, with_meridiem=True):
+    """Google style: 10am, 10:30am."""
+    minutes %= 24 * 60
+    hour, minute = divmod(minutes, 60)
+    meridiem = "am" if hour < 12 else "pm"
+    hour = hour % 12 or 12
+    text = f"{hour}" if minute == 0 else f"{hour}:{minute:02d}"
+    return text + meridiem if with_meridiem else text
+
+
+# -------------------------
+# 页面
+# -------------------------
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Calendar stand-in</title>
+<style>
+  [hidden] {{ display: none !important; }}
+  [role="button"] {{ border: 1px solid #88a; margin: 4px; padding: 4px; }}
+  td[data-date], [role="gridcell"], [role="option"] {{ cursor: pointer; padding: 2px 6px; }}
+</style>
+</head>
+<body>
+<header>
+  <button id="create">Create</button>
+  <span id="heading">{heading}</span>
+</header>
+<section id="menu" hidden>
+  <div id="menu-event" role="menuitem">Event</div>
+  <div role="menuitem">Task</div>
+</section>
+<section id="quick" role="dialog" hidden>
+  <input id="quick-title" aria-label="Add title">
+  <button id="more">More options</button>
+</section>
+<section id="editor" role="dialog" hidden>
+  <input id="edit-title" aria-label="Title">
+  <input id="start-date" aria-label="Start date" readonly>
+  <table id="start-picker" hidden><tbody id="start-picker-body"></tbody></table>
+  <input id="start-time" role="combobox" aria-label="Start time" readonly>
+  <ul id="start-options" role="listbox" hidden></ul>
+  <input id="end-time" role="combobox" aria-label="End time" readonly>
+  <ul id="end-options" role="listbox" hidden></ul>
+  <input id="end-date" aria-label="End date" readonly>
+  <section id="end-picker" hidden></section>
+  <textarea id="edit-details" aria-label="Description"></textarea>
+  <button id="save">Save</button>
+</section>
+<main>
+{body}
+</main>
+<script>
+const DAY_NAMES = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"];
+const state = {{ startDate: "{today}", endDate: "{today}", startTime: "09:00", endTime: "10:00" }};
+const $ = (id) => document.getElementById(id);
+
+function clock(minutes) {{
+  minutes = ((minutes % 1440) + 1440) % 1440;
+  const h = Math.floor(minutes / 60), m = minutes % 60;
+  return `${{h % 12 || 12}}:${{String(m).padStart(2, "0")}}${{h < 12 ? "am" : "pm"}}`;
+}}
+function toMinutes(hhmm) {{ const [h, m] = hhmm.split(":").map(Number); return h * 60 + m; }}
+function toHHMM(minutes) {{
+  return `${{String(Math.floor(minutes / 60) % 24).padStart(2, "0")}}:${{String(minutes % 60).padStart(2, "0")}}`;
+}}
+function parseDate(iso) {{ const [y, m, d] = iso.split("-").map(Number); return new Date(y, m - 1, d); }}
+function isoDate(dt) {{
+  return `${{dt.getFullYear()}}-${{String(dt.getMonth() + 1).padStart(2, "0")}}-${{String(dt.getDate()).padStart(2, "0")}}`;
+}}
+
+function render() {{
+  $("start-date").value = state.startDate;
+  $("end-date").value = state.endDate;
+  $("start-time").value = clock(toMinutes(state.startTime));
+  $("end-time").value = clock(toMinutes(state.endTime));
+}}
+
+function hideLists() {{
+  for (const id of ["start-picker", "start-options", "end-options", "end-picker"]) $(id).hidden = true;
+}}
+
+$("create").onclick = () => {{ setTimeout(() => {{ $("menu").hidden = false; }}, {ui_delay}); }};
+$("menu-event").onclick = () => {{
+  $("menu").hidden = true;
+  setTimeout(() => {{ $("quick").hidden = false; $("quick-title").focus(); }}, {ui_delay});
+}};
+$("more").onclick = () => {{
+  $("edit-title").value = $("quick-title").value;
+  $("quick").hidden = true;
+  setTimeout(() => {{ $("editor").hidden = false; render(); }}, {ui_delay});
+}};
+
+$("start-date").onclick = () => {{
+  hideLists();
+  const body = $("start-picker-body");
+  body.innerHTML = "";
+  const first = parseDate(state.startDate);
+  first.setDate(first.getDate() - 60);
+  let row;
+  for (let i = 0; i < 180; i++) {{
+    const d = new Date(first.getFullYear(), first.getMonth(), first.getDate() + i);
+    if (i % 7 === 0) {{ row = document.createElement("tr"); body.appendChild(row); }}
+    const cell = document.createElement("td");
+    cell.dataset.date = isoDate(d).replaceAll("-", "");
+    cell.textContent = d.getDate();
+    cell.onclick = () => {{
+      state.startDate = isoDate(d);
+      if (state.endDate < state.startDate) state.endDate = state.startDate;
+      hideLists(); render();
+    }};
+    row.appendChild(cell);
+  }}
+  $("start-picker").hidden = false;
+}};
+
+$("start-time").onclick = () => {{
+  hideLists();
+  const list = $("start-options");
+  list.innerHTML = "";
+  for (let m = 0; m < 1440; m += 15) {{
+    const li = document.createElement("li");
+    li.setAttribute("role", "option");
+    li.textContent = clock(m);
+    li.onclick = () => {{
+      const length = toMinutes(state.endTime) - toMinutes(state.startTime);
+      state.startTime = toHHMM(m);
+      state.endTime = toHHMM(Math.min(m + Math.max(length, 15), 1439));
+      hideLists(); render();
+    }};
+    list.appendChild(li);
+  }}
+  list.hidden = false;
+}};
+
+$("end-time").onclick = () => {{
+  hideLists();
+  const list = $("end-options");
+  list.innerHTML = "";
+  const start = toMinutes(state.startTime);
+  for (let m = start + 15; m < 1440; m += 15) {{
+    const mins = m - start;
+    const length = mins < 60 ? `${{mins}} mins` : `${{mins / 60}} hr${{mins === 60 ? "" : "s"}}`;
+    const li = document.createElement("li");
+    li.setAttribute("role", "option");
+    li.textContent = `${{clock(m)}} (${{length}})`;
+    li.onclick = () => {{ state.endTime = toHHMM(m); hideLists(); render(); }};
+    list.appendChild(li);
+  }}
+  list.hidden = false;
+}};
+
+$("end-date").onclick = () => {{
+  hideLists();
+  const picker = $("end-picker");
+  picker.innerHTML = "";
+  const base = parseDate(state.endDate);
+  const days = new Date(base.getFullYear(), base.getMonth() + 1, 0).getDate();
+  for (let day = 1; day <= days; day++) {{
+    const d = new Date(base.getFullYear(), base.getMonth(), day);
+    const cell = document.createElement("span");
+    cell.setAttribute("role", "gridcell");
+    cell.setAttribute("aria-label", `${{day}}, ${{DAY_NAMES[d.getDay()]}}`);
+    cell.textContent = day;
+    cell.onclick = () => {{ state.endDate = isoDate(d); hideLists(); render(); }};
+    picker.appendChild(cell);
+  }}
+  picker.hidden = false;
+}};
+
+$("save").onclick = async () => {{
+  const payload = {{
+    title: $("edit-title").value,
+    start_date: state.startDate, start_time: state.startTime,
+    end_date: state.endDate, end_time: state.endTime,
+    description: $("edit-details").value
+  }};
+  await fetch("/api/events", {{
+    method: "POST", headers: {{ "Content-Type": "application/json" }}, body: JSON.stringify(payload)
+  }});
+  location.href = "/calendar/u/0/r/day/" + state.startDate.replaceAll("-", "/");
+}};
+
+{init}
+</script>
+</body>
+</html>
+"""
+
+
+def _event_button(event):
+    start, end = event["start"], event["end"]
+    title = html.escape(event["title"])
+    return (
+        '<div role="button">'
+        f"<div>{title}</div>"
+        f"<div>{_clock(start)} to {_clock(end)}</div>"
+        f"<div>{_clock(start)} – {_clock(end)}</div>"
+        "</div>"
+    )
+
+
+def render_page(heading, body="", today=None, init="", ui_delay=0):
+    return PAGE_TEMPLATE.format(
+        heading=html.escape(heading),
+        body=body,
+        today=(today or date.today()).isoformat(),
+        init=init,
+        ui_delay=int(ui_delay * 1000),
+    )
+
+
+# -------------------------
+# 应用
+# -------------------------
+def create_app(latency=DEFAULT_LATENCY, jitter=DEFAULT_JITTER, density=DEFAULT_DENSITY,
+               ui_delay=0.0, seed=0):
+    app = FastAPI(title="Calendar stand-in")
+    store = FakeCalendarStore(density=density, seed=seed)
+    rng = random.Random(seed)
+    app.state.store = store
+
+    @app.middleware("http")
+    async def artificial_latency(request: Request, call_next):
+        delay = latency + (rng.uniform(0, jitter) if jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        return await call_next(request)
+
+    def day_view(day):
+        buttons = "\n".join(_event_button(e) for e in store.events(day.isoformat()))
+        body = f'<div role="grid" aria-label="{day:%A, %B %d}">\n{buttons}\n</div>'
+        return HTMLResponse(render_page(f"{day:%A, %B %d, %Y}", body, today=day, ui_delay=ui_delay))
+
+    def week_view(day):
+        first = day - timedelta(days=(day.weekday() + 1) % 7)
+        columns = []
+        for offset in range(7):
+            current = first + timedelta(days=offset)
+            previous = store.events((current - timedelta(days=1)).isoformat())
+            events = [e for e in previous if e["end"] > 24 * 60] + store.events(current.isoformat())
+            buttons = "\n".join(_event_button(e) for e in events)
+            columns.append(f'<div class="day-column" data-datekey="{datekey(current)}">\n{buttons}\n</div>')
+        body = f'<div role="grid" aria-label="Week of {first:%B %d}">\n' + "\n".join(columns) + "\n</div>"
+        return HTMLResponse(render_page(f"Week of {first:%B %d, %Y}", body, today=day, ui_delay=ui_delay))
+
+    @app.get("/")
+    def home():
+        return RedirectResponse("/calendar/u/0/r")
+
+    @app.get("/calendar/u/0/r")
+    def today_view():
+        return day_view(date.today())
+
+    @app.get("/calendar/u/0/r/day/{year}/{month}/{day}")
+    def get_day_view(year: int, month: int, day: int):
+        return day_view(date(year, month, day))
+
+    @app.get("/calendar/u/0/r/week/{year}/{month}/{day}")
+    def get_week_view(year: int, month: int, day: int):
+        return week_view(date(year, month, day))
+
+    @app.get("/calendar/u/0/r/eventedit")
+    def event_edit(text: str = "", dates: str = "", details: str = ""):
+        start_raw, _, end_raw = dates.partition("/")
+        start = datetime.strptime(start_raw, "%Y%m%dT%H%M%S")
+        end = datetime.strptime(end_raw, "%Y%m%dT%H%M%S") if end_raw else start + timedelta(hours=1)
+        init = (
+            f'state.startDate = "{start:%Y-%m-%d}"; state.startTime = "{start:%H:%M}";\n'
+            f'state.endDate = "{end:%Y-%m-%d}"; state.endTime = "{end:%H:%M}";\n'
+            f"$(\"edit-title\").value = {_js_string(text)};\n"
+            f"$(\"edit-details\").value = {_js_string(details)};\n"
+            '$("editor").hidden = false; render();'
+        )
+        return HTMLResponse(render_page("Edit event", today=start.date(), init=init, ui_delay=ui_delay))
+
+    @app.post("/api/events")
+    def create_event(event: EventIn):
+        store.add(event)
+        return {"status": "created"}
+
+    @app.get("/api/events")
+    def list_events(day: str):
+        return store.events(day)
+
+    @app.get("/api/stats")
+    def stats():
+        return {"created": store.created}
+
+    return app
+
+
+def _js_string(value):
+    return json.dumps(value).replace("</", "<\\/")
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local Google Calendar stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY,
+                        help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER,
+                        help="extra random delay of up to this many seconds")
+    parser.add_argument("--ui-delay", type=float, default=0.0,
+                        help="seconds before menus and dialogs appear after a click")
+    parser.add_argument("--density", type=int, default=DEFAULT_DENSITY,
+                        help="busy events seeded per day")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    app = create_app(args.latency, args.jitter, args.density, args.ui_delay, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
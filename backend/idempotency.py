@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+
+from accounts import DEFAULT_ACCOUNT
+from jobs import FAILED, CANCELLED
+from metrics import IDEMPOTENCY_LOOKUPS
+
+
+def client_key(idempotency_key, account_id=None):
+    return ("client", account_id or DEFAULT_ACCOUNT, idempotency_key)
+
+
+def content_key(event, account_id=None):
+    """The same event said twice: normalized title plus start and end, per account."""
+    title = " ".join(event["title"].split()).lower()
+    return (
+        "content",
+        account_id or DEFAULT_ACCOUNT,
+        title,
+        f"{event['start_date']} {event['start_time']}",
+        f"{event['end_date']} {event['end_time']}",
+    )
+
+
+# -------------------------
+# 重复提交缓存
+# -------------------------
+class IdempotencyCache:
+    """
+    Jobs of recent /speech submissions, keyed by client idempotency key and
+    by content key, kept for ttl seconds (at most maxsize keys). A job that
+    is resumed with a different event is rekey()ed, so the original
+    sentence can be submitted again.
+
+    claim() looks the keys up and, if none matches, creates the job under
+    the same lock, so two identical posts arriving together cannot both
+    start a browser session. Failed and cancelled jobs do not count, so a
+    retry after a failure runs again.
+    """
+
+    def __init__(self, ttl=600, maxsize=1000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        # Called with self._lock held
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        job, stored_at = entry
+        if now - stored_at >= self.ttl or job.status in (FAILED, CANCELLED):
+            del self._entries[key]
+            return None
+        return job
+
+    def _put(self, key, job, now):
+        # Called with self._lock held
+        self._entries[key] = (job, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def claim(self, keys, create):
+        """Return (job, True) for a known key, else (create(), False) remembered under every key."""
+        keys = [k for k in keys if k is not None]
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                job = self._get(key, now)
+                if job is not None:
+                    self.hits += 1
+                    IDEMPOTENCY_LOOKUPS.inc(result="hit")
+                    # Later retries with the other keys find it too
+                    for other in keys:
+                        if other not in self._entries:
+                            self._put(other, job, now)
+                    return job, True
+            self.misses += 1
+            IDEMPOTENCY_LOOKUPS.inc(result="miss")
+            job = create()
+            for key in keys:
+                self._put(key, job, now)
+            return job, False
+
+    def remember(self, key, job):
+        with self._lock:
+            self._put(key, job, time.monotonic())
+
+    def rekey(self, job, old_key, new_key):
+        """Move job from old_key to new_key, e.g. after it was resumed with a different time."""
+        with self._lock:
+            entry = self._entries.get(old_key)
+            if entry is not None and entry[0] is job:
+                del self._entries[old_key]
+            self._put(new_key, job, time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._entries), "hits": self.hits, "misses": self.misses}
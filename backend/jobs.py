@@ -0,0 +1,210 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import tracing
+
+# 任务状态
+QUEUED = "queued"
+PARSED = "parsed"
+CHECKING_CONFLICTS = "checking_conflicts"
+CREATING = "creating"
+AWAITING_INPUT = "awaiting_input"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# Returned by a handler whose job waits for more input; the job stays open
+# until JobQueue.resume() puts it back or it is finished from outside.
+PARKED = object()
+
+
+class Job:
+    """
+    One /speech request travelling through the background scheduler.
+
+    Status changes go through update(), which also pushes a snapshot to every
+    subscribed WebSocket stream. Follow-up utterances of the same
+    conversation are appended to replies. request_id is the trace id of the
+    request that submitted the job; the job itself is traced under its id.
+    """
+
+    def __init__(self, text, **meta):
+        self.id = uuid.uuid4().hex
+        self.text = text
+        self.meta = meta
+        self.session_id = meta.get("session_id") or self.id
+        self.request_id = tracing.current_request_id()
+        self.replies = []
+        self.status = QUEUED
+        self.event = None
+        self.result = None
+        self.error = None
+        self.prompt = None
+        self.prompt_parts = None
+        self.conflicts = None
+        self.suggestions = None
+        self.accepted = None
+        self.expires_at = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.history = [(QUEUED, self.created_at)]
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._finished = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    @property
+    def latest_text(self):
+        return self.replies[-1] if self.replies else self.text
+
+    def update(self, status, **fields):
+        with self._lock:
+            self.status = status
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self.updated_at = time.time()
+            self.history.append((status, self.updated_at))
+            snapshot = self._snapshot()
+            subscribers = list(self._subscribers)
+        for loop, q in subscribers:
+            try:
+                loop.call_soon_threadsafe(q.put_nowait, snapshot)
+            except RuntimeError:
+                # Event loop already closed, the stream is gone
+                pass
+        if status in FINISHED_STATES:
+            self._finished.set()
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+    def subscribe(self, loop, q):
+        """Register an asyncio queue; it receives the current snapshot at once."""
+        with self._lock:
+            self._subscribers.append((loop, q))
+            q.put_nowait(self._snapshot())
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers = [(l, s) for l, s in self._subscribers if s is not q]
+
+    def _snapshot(self):
+        return {
+            "job_id": self.id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "text": self.text,
+            "replies": list(self.replies),
+            "event": self.event,
+            "result": self.result,
+            "error": self.error,
+            "prompt": self.prompt,
+            "prompt_parts": self.prompt_parts,
+            "conflicts": self.conflicts,
+            "suggestions": self.suggestions,
+            "expires_at": self.expires_at,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "history": [{"status": s, "at": t} for s, t in self.history],
+        }
+
+    def to_dict(self):
+        with self._lock:
+            return self._snapshot()
+
+
+_STOP = object()
+
+
+# -------------------------
+# 后台调度器
+# -------------------------
+class JobQueue:
+    """
+    FIFO queue of Jobs drained by a fixed set of background worker threads.
+
+    handler(job) does the actual work and may call job.update() to report
+    progress; its return value becomes job.result. A handler that returns
+    PARKED leaves the job open without holding a worker; resume() queues it
+    again. Only the most recent max_jobs jobs are kept for status lookups.
+    """
+
+    def __init__(self, handler, workers=2, max_jobs=1000):
+        self.handler = handler
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            self._threads.append(t)
+            t.start()
+        tracing.debug("Job scheduler started", workers=self.workers)
+
+    def submit(self, text, **meta):
+        job = Job(text, **meta)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            self._evict()
+        self._queue.put(job)
+        return job
+
+    def resume(self, job, reply=None, **fields):
+        """Queue a parked job again, e.g. after the user answered a follow-up question."""
+        if reply is not None:
+            fields["replies"] = job.replies + [reply]
+        job.update(QUEUED, prompt=None, prompt_parts=None, conflicts=None, suggestions=None, expires_at=None, **fields)
+        self._queue.put(job)
+
+    def get(self, job_id):
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def close(self, timeout=5):
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def _evict(self):
+        # Drop the oldest finished jobs once over the retention limit
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            if self._jobs[job_id].finished:
+                del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                break
+            with tracing.request_context(job.id):
+                try:
+                    result = self.handler(job)
+                except Exception as e:
+                    tracing.error("Job failed", job=job.id, error=repr(e))
+                    job.update(FAILED, error=str(e) or type(e).__name__)
+                else:
+                    if result is not PARKED:
+                        job.update(DONE, result=result)
@@ -1,17 +1,261 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from nlu import parse_event
-from calendar_bot import add_event_to_calendar
-import subprocess
+from typing import List, Literal, Optional
+from nlu import parse_event, parse_start_date
+from calendar_bot import add_event_on_page, add_events_on_page, create_suggested_event, prefetch_days, conflict_message, conflict_prompt_parts, PROMPT_PHRASES, CREATE_MODES, CALENDAR_BASE_URL
+from worker_pool import ChromeWorkerPool, WorkerPoolBusy, workers_for_cpus
+from accounts import AccountRegistry, AccountLimitError, ACCOUNT_ID_RE
+from waits import waits
+from conflicts import event_dates
+from prefetch import ScrapeCache, InterimDateTracker
+from idempotency import IdempotencyCache, client_key, content_key
+from event_store import EventStore
+from browser_launcher import default_chrome_path, default_profile_dir
+from tts import tts_worker
+from audio_cache import PhraseAudioCache
+from metrics import REGISTRY, CONTENT_TYPE, REQUESTS, span
+import tracing
+from tracing import tracer, request_context, new_request_id, REQUEST_ID_RE
+from jobs import JobQueue, PARSED, AWAITING_INPUT, FAILED, CANCELLED, PARKED, FINISHED_STATES
+from conversation import ConversationManager, reply_outcome
 import time
 import os
 
-latest_recognized_text = None
+def env_flag(name, default="0"):
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
 
-app = FastAPI()
 
-print("[DEBUG] FastAPI app starting...")
+# Chrome 配置
+CHROME_PATH = os.getenv("CHROME_PATH") or default_chrome_path()
+USER_DATA_DIR = os.getenv("CHROME_PROFILE_DIR") or default_profile_dir()
+DEBUG_PORT = int(os.getenv("CHROME_DEBUG_PORT", "9222"))
+CHROME_HEADLESS = env_flag("CHROME_HEADLESS")
+CHROME_LAZY_START = env_flag("CHROME_LAZY_START")
+CHROME_STARTUP_TIMEOUT = float(os.getenv("CHROME_STARTUP_TIMEOUT", "30"))
+
+# Chrome 工作进程数：CHROME_WORKERS 指定个数，设为 auto 时按 CPU 核数 × CHROME_WORKERS_PER_CPU
+CHROME_WORKERS_PER_CPU = float(os.getenv("CHROME_WORKERS_PER_CPU", "0.5"))
+_chrome_workers = os.getenv("CHROME_WORKERS", "1").strip().lower()
+CHROME_WORKERS = workers_for_cpus(CHROME_WORKERS_PER_CPU) if _chrome_workers == "auto" else int(_chrome_workers)
+
+# 预热页面池配置
+PAGE_POOL_SIZE = int(os.getenv("PAGE_POOL_SIZE", "2"))
+PAGE_MAX_AGE = float(os.getenv("PAGE_MAX_AGE", "900"))
+PAGE_MAX_USES = int(os.getenv("PAGE_MAX_USES", "50"))
+PAGE_HEALTH_INTERVAL = float(os.getenv("PAGE_HEALTH_INTERVAL", "30"))
+# 登录状态缓存秒数（空闲页面在过半时后台复查），等待重新登录时检查 cookie 的间隔
+LOGIN_STATE_TTL = float(os.getenv("LOGIN_STATE_TTL", "300"))
+LOGIN_POLL_INTERVAL = float(os.getenv("LOGIN_POLL_INTERVAL", "1"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(PAGE_POOL_SIZE * CHROME_WORKERS)))
+# 所有页面都在忙时最多允许多少个日历任务排队等待，超出后返回 503
+MAX_WAITING_TASKS = int(os.getenv("MAX_WAITING_TASKS", str(PAGE_POOL_SIZE * CHROME_WORKERS * 2)))
+# 排队任务等待空闲页面的最长秒数
+CHROME_ACQUIRE_TIMEOUT = float(os.getenv("CHROME_ACQUIRE_TIMEOUT", "60"))
+
+# 默认事件创建方式（url / form），可按请求覆盖
+DEFAULT_CREATE_MODE = os.getenv("CREATE_MODE", "url")
+if DEFAULT_CREATE_MODE not in CREATE_MODES:
+    raise ValueError(f"CREATE_MODE must be one of {CREATE_MODES}, got {DEFAULT_CREATE_MODE!r}")
+
+# 多账户配置：每个 account_id 使用独立的 Chrome 配置目录和调试端口
+ACCOUNT_PROFILE_ROOT = os.getenv("ACCOUNT_PROFILE_ROOT") or os.path.join(os.path.dirname(USER_DATA_DIR), "accounts")
+ACCOUNT_PORT_BASE = int(os.getenv("ACCOUNT_PORT_BASE", str(DEBUG_PORT + CHROME_WORKERS)))
+MAX_ACCOUNTS = int(os.getenv("MAX_ACCOUNTS", "4"))
+ACCOUNT_IDLE_TIMEOUT = float(os.getenv("ACCOUNT_IDLE_TIMEOUT", "600"))
+ACCOUNT_POOL_SIZE = int(os.getenv("ACCOUNT_POOL_SIZE", "1"))
+
+# 冲突后等待用户说出新时间的最长秒数
+CONFLICT_REPLY_TIMEOUT = float(os.getenv("CONFLICT_REPLY_TIMEOUT", "120"))
+
+# 流式识别时的预取：日期在连续几条中间结果里保持不变才预取，预取结果的有效秒数，任务等待预取完成的最长秒数
+PREFETCH_STABLE_COUNT = int(os.getenv("PREFETCH_STABLE_COUNT", "2"))
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "60"))
+PREFETCH_WAIT_TIMEOUT = float(os.getenv("PREFETCH_WAIT_TIMEOUT", "10"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+
+# 重复提交：相同幂等键或相同日程（标题、开始、结束）在多少秒内视为同一请求
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "600"))
+
+# 本地日程库（SQLite）：抓取结果和新建的日程都写入，距上次抓取不超过 EVENT_STORE_MAX_AGE 秒的日期直接用库中数据检查冲突（0 表示不读）
+EVENT_STORE_PATH = os.getenv("EVENT_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "event_store.sqlite3"))
+EVENT_STORE_MAX_AGE = float(os.getenv("EVENT_STORE_MAX_AGE", "300"))
+
+# 语音片段缓存配置
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio_cache"))
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+audio_cache = PhraseAudioCache(AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES)
+
+PAGE_OPTIONS = {
+    "max_page_age": PAGE_MAX_AGE,
+    "max_page_uses": PAGE_MAX_USES,
+    "health_interval": PAGE_HEALTH_INTERVAL,
+    "login_ttl": LOGIN_STATE_TTL,
+    "login_poll_interval": LOGIN_POLL_INTERVAL,
+    "warm_url": CALENDAR_BASE_URL,
+}
+
+chrome_workers = ChromeWorkerPool(
+    CHROME_WORKERS,
+    USER_DATA_DIR,
+    port_base=DEBUG_PORT,
+    binary=CHROME_PATH,
+    headless=CHROME_HEADLESS,
+    startup_timeout=CHROME_STARTUP_TIMEOUT,
+    pages_per_worker=PAGE_POOL_SIZE,
+    max_waiting=MAX_WAITING_TASKS,
+    acquire_timeout=CHROME_ACQUIRE_TIMEOUT,
+    pool_options=PAGE_OPTIONS,
+)
+
+accounts = AccountRegistry(
+    chrome_workers,
+    profile_root=ACCOUNT_PROFILE_ROOT,
+    port_base=ACCOUNT_PORT_BASE,
+    max_accounts=MAX_ACCOUNTS,
+    idle_timeout=ACCOUNT_IDLE_TIMEOUT,
+    pool_size=ACCOUNT_POOL_SIZE,
+    launcher_options={
+        "binary": CHROME_PATH,
+        "headless": CHROME_HEADLESS,
+        "startup_timeout": CHROME_STARTUP_TIMEOUT,
+    },
+    pool_options=PAGE_OPTIONS,
+)
+
+conversations = ConversationManager(timeout=CONFLICT_REPLY_TIMEOUT)
+
+scrape_cache = ScrapeCache(ttl=PREFETCH_TTL, workers=PREFETCH_WORKERS)
+
+submissions = IdempotencyCache(ttl=IDEMPOTENCY_TTL)
+
+event_store = EventStore(EVENT_STORE_PATH, max_age=EVENT_STORE_MAX_AGE)
+
+
+def check_and_create(page, step, account_id, event, **kwargs):
+    """
+    Run a calendar step for event; called under the event's date locks.
+
+    The conflict check starts from the days prefetched while the user was
+    still speaking, then from the days fresh in the event store. A created
+    event makes the prefetched days stale, so they leave the cache before
+    the locks are released (the store records the event itself).
+    """
+    dates = event_dates(event)
+    kwargs["indexes"] = scrape_cache.lookup(account_id, dates)
+    outcome = step(page, event, store=event_store.account(account_id), **kwargs)
+    if outcome["status"] == "created":
+        scrape_cache.invalidate(account_id, dates)
+    return outcome
+
+
+def create_batch(page, account_id, events, create_mode):
+    outcomes = add_events_on_page(page, events, create_mode, store=event_store.account(account_id))
+    created = [d for o in outcomes if o["status"] == "created" for d in event_dates(o["event"])]
+    if created:
+        scrape_cache.invalidate(account_id, created)
+    return outcomes
+
+
+def run_speech_job(job):
+    create_mode = job.meta.get("create_mode") or DEFAULT_CREATE_MODE
+    account_id = job.meta.get("account_id")
+    previous = job.event
+    if job.accepted is not None:
+        # The user picked one of the suggested free slots: no parsing, just re-check and create it
+        event = job.accepted
+        job.update(PARSED, event=event, accepted=None)
+        step = create_suggested_event
+    else:
+        with span("parse_event"):
+            event = parse_event(job.latest_text)
+        tracing.debug("Parsed event", event=event)
+        job.update(PARSED, event=event)
+        step = add_event_on_page
+
+    if previous is not None and previous != event:
+        # Resumed with another time: the original sentence no longer stands for this job
+        submissions.rekey(job, content_key(previous, account_id), content_key(event, account_id))
+    scrape_cache.wait(account_id, event_dates(event), PREFETCH_WAIT_TIMEOUT)
+    outcome = accounts.run(account_id, check_and_create, step, account_id, event,
+                           lock_keys=(event["start_date"], event["end_date"]), affinity=job.session_id,
+                           on_progress=job.update, create_mode=create_mode)
+    tracing.debug("Calendar step finished", status=outcome["status"])
+
+    if outcome["status"] == "conflict":
+        return park_for_reply(job, outcome)
+    return {"status": "success", "event": outcome["event"]}
+
+
+def park_for_reply(job, outcome):
+    """Ask the session for another time without holding a worker or a page."""
+    future = conversations.park(job.session_id, job)
+    job.update(
+        AWAITING_INPUT,
+        prompt=conflict_message(outcome["event"], outcome["suggestions"]),
+        prompt_parts=conflict_prompt_parts(outcome["event"], outcome["suggestions"]),
+        conflicts=outcome["conflicts"],
+        suggestions=outcome["suggestions"],
+        expires_at=time.time() + CONFLICT_REPLY_TIMEOUT,
+    )
+    tracing.info("Job waiting for a new time", session=job.session_id)
+    # Added after the status update so an early reply cannot overtake it
+    future.add_done_callback(lambda f: on_reply(job, f))
+    return PARKED
+
+
+def on_reply(job, future):
+    kind, answer = reply_outcome(future)
+    if kind == "reply" and isinstance(answer, dict):
+        with request_context(job.id):
+            tracing.info("Job resumed with suggested slot", date=answer["start_date"], start=answer["start_time"])
+        job_queue.resume(job, accepted=answer)
+    elif kind == "reply":
+        with request_context(job.id):
+            tracing.info("Job resumed with a new time", text=answer)
+        job_queue.resume(job, answer)
+    elif kind == "timeout":
+        job.update(FAILED, error="等待新的时间超时")
+    else:
+        job.update(CANCELLED, error="已取消")
+
+
+job_queue = JobQueue(run_speech_job, workers=JOB_WORKERS)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    started = time.monotonic()
+    tts_worker.start()
+    audio_cache.prerender(list(PROMPT_PHRASES.values()))
+    if CHROME_LAZY_START:
+        tracing.debug("Chrome launch deferred until the first calendar request")
+    else:
+        await asyncio.to_thread(chrome_workers.launch_all)
+    # Warm pages would launch Chrome through ensure_browser, so lazy start leaves them for the first job
+    chrome_workers.start(warm=not CHROME_LAZY_START)
+    conversations.start()
+    accounts.start()
+    job_queue.start()
+    tracing.debug("Startup finished", seconds=round(time.monotonic() - started, 2))
+    yield
+    scrape_cache.close()
+    conversations.close()
+    job_queue.close()
+    accounts.close()
+    chrome_workers.close()
+    event_store.close()
+    tts_worker.close()
+    tracer.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+tracing.debug("FastAPI app starting")
 
 # ⚡ CORS setup
 origins = [
@@ -26,56 +270,306 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    # Everything traced while handling the request, on any thread, carries this id
+    request_id = request.headers.get("x-request-id", "")
+    if not REQUEST_ID_RE.match(request_id):
+        request_id = new_request_id()
+    with request_context(request_id):
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
 class SpeechInput(BaseModel):
     text: str
-    
-CHROME_PATH = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
-USER_DATA_DIR = r"C:\temp\chrome_debug_profile"
-DEBUG_PORT = 9222
-
-os.makedirs(USER_DATA_DIR, exist_ok=True)
-
-cmd = [
-    CHROME_PATH,
-    f"--remote-debugging-port={DEBUG_PORT}",
-    f"--user-data-dir={USER_DATA_DIR}",
-    "--no-first-run",
-    "--no-default-browser-check",
-]
+    create_mode: Optional[Literal["url", "form"]] = None
+    session_id: Optional[str] = None
+    account_id: Optional[str] = None
+    idempotency_key: Optional[str] = None
+
+
+class AcceptSlotInput(BaseModel):
+    index: int = 0
+
+
+class BatchSpeechInput(BaseModel):
+    texts: List[str]
+    create_mode: Optional[Literal["url", "form"]] = None
+    account_id: Optional[str] = None
+
+
+def check_account_id(account_id):
+    if account_id is not None and not ACCOUNT_ID_RE.match(account_id):
+        raise HTTPException(status_code=400, detail="account_id must be 1-64 letters, digits or _.@- and not start with a dot")
 
-chrome_proc = subprocess.Popen(cmd)
 
-# 等待 Chrome 完全启动
-time.sleep(3)
+def submit_speech(text, create_mode=None, session_id=None, account_id=None, idempotency_key=None):
+    # A follow-up utterance answers the session's pending conflict question
+    if session_id:
+        job = conversations.reply(session_id, text)
+        if job is not None:
+            if idempotency_key:
+                # A retry of this answer should find the resumed job
+                submissions.remember(client_key(idempotency_key, account_id), job)
+            tracing.info("Reply resumed job", job=job.id)
+            return {"status": "resumed", "job_id": job.id}
+
+    try:
+        with span("parse_event"):
+            event = parse_event(text)
+    except ValueError as e:
+        tracing.info("Speech text not understood", error=str(e))
+        return {"status": "failed", "text": text, "error": str(e)}
+    key = content_key(event, account_id)
+
+    def submit():
+        # Backpressure: every page is busy and the backlog is already full
+        if chrome_workers.saturated() or job_queue.pending() >= MAX_WAITING_TASKS:
+            raise HTTPException(status_code=503, detail="all Chrome workers are busy",
+                                headers={"Retry-After": "5"})
+        return job_queue.submit(text, create_mode=create_mode, session_id=session_id,
+                                account_id=account_id)
+
+    # The same request again (retry, double recognition, reload) gets the original job
+    keys = [client_key(idempotency_key, account_id) if idempotency_key else None, key]
+    job, duplicate = submissions.claim(keys, submit)
+    if duplicate:
+        tracing.info("Duplicate submission", job=job.id, job_status=job.status)
+        return {"status": "duplicate", "job_id": job.id, "job_status": job.status}
+
+    tracing.info("Job queued", job=job.id)
+    return {
+        "status": "queued",
+        "job_id": job.id
+    }
 
-print("Chrome 已启动，调试端口:", DEBUG_PORT)
 
 @app.post("/speech")
-def handle_speech(data: SpeechInput):
-    global latest_recognized_text
-    latest_recognized_text = data.text
-    print("[DEBUG] /speech endpoint called")
-    print("[DEBUG] Raw input text:", data.text)
+def handle_speech(data: SpeechInput, request: Request):
+    REQUESTS.inc(endpoint="/speech")
+    tracing.debug("/speech called", text=data.text, session=data.session_id, account=data.account_id)
+    check_account_id(data.account_id)
+    idempotency_key = data.idempotency_key or request.headers.get("idempotency-key")
+    return submit_speech(data.text, data.create_mode, data.session_id, data.account_id, idempotency_key)
+
+
+def prefetch_for(account_id, session_id, date):
+    """Scrape date's days in the background so the job finds them cached."""
+    if chrome_workers.saturated():
+        # Speculative work must not take pages from real jobs
+        return False
+    return scrape_cache.prefetch(
+        account_id, date,
+        lambda: accounts.run(account_id, prefetch_days, date, store=event_store.account(account_id),
+                             affinity=session_id),
+    )
+
+
+@app.websocket("/speech/stream")
+async def stream_speech(websocket: WebSocket):
+    """
+    Interim transcripts in, job id out.
+
+    Messages are {"text", "final"?, "create_mode"?, "idempotency_key"?}; session_id and
+    account_id come from the query string. Interim texts are parsed as they
+    arrive and, once their date is stable, that day is prefetched. A final
+    text is handled like POST /speech and answered with the same response.
+    """
+    await websocket.accept()
+    session_id = websocket.query_params.get("session_id")
+    account_id = websocket.query_params.get("account_id")
+    if account_id is not None and not ACCOUNT_ID_RE.match(account_id):
+        await websocket.close(code=4400)
+        return
+    REQUESTS.inc(endpoint="/speech/stream")
+    tracker = InterimDateTracker(parse_start_date, stable_count=PREFETCH_STABLE_COUNT)
+    # One trace id per stream; jobs it submits link back to it
+    with request_context(new_request_id()):
+        try:
+            while True:
+                message = await websocket.receive_json()
+                text = (message.get("text") or "").strip()
+                if not message.get("final"):
+                    try:
+                        date = tracker.observe(text) if text else None
+                    except ValueError:
+                        # e.g. "24点" halfway through a sentence; wait for the next transcript
+                        date = None
+                    if date is not None and await asyncio.to_thread(prefetch_for, account_id, session_id, date):
+                        await websocket.send_json({"status": "prefetching", "date": date})
+                    continue
 
-    print("[DEBUG] Parsing event from text...")
-    event = parse_event(data.text)
+                tracing.debug("Final streamed text", text=text)
+                tracker.reset()
+                create_mode = message.get("create_mode")
+                if create_mode not in CREATE_MODES:
+                    create_mode = None
+                try:
+                    response = await asyncio.to_thread(submit_speech, text, create_mode, session_id, account_id,
+                                                       message.get("idempotency_key"))
+                except HTTPException as e:
+                    response = {"status": "busy", "detail": e.detail}
+                except ValueError as e:
+                    response = {"status": "failed", "text": text, "error": str(e)}
+                await websocket.send_json(response)
+        except WebSocketDisconnect:
+            pass
 
-    print("[DEBUG] Parsed event:", event)
 
-    print("[DEBUG] Adding event to Google Calendar...")
-    add_event_to_calendar(event)
+@app.post("/speech/batch")
+def handle_speech_batch(data: BatchSpeechInput):
+    REQUESTS.inc(endpoint="/speech/batch")
+    tracing.debug("/speech/batch called", items=len(data.texts), account=data.account_id)
+    check_account_id(data.account_id)
 
-    print("[DEBUG] Calendar event process finished")
+    results = [None] * len(data.texts)
+    events = []
+    positions = []
+    for i, text in enumerate(data.texts):
+        try:
+            with span("parse_event"):
+                event = parse_event(text)
+        except ValueError as e:
+            results[i] = {"status": "failed", "text": text, "error": str(e)}
+            continue
+        events.append(event)
+        positions.append(i)
 
-    response = {
-        "status": "success",
-        "event": event
+    if events:
+        try:
+            outcomes = accounts.run(data.account_id, create_batch, data.account_id, events,
+                                    data.create_mode or DEFAULT_CREATE_MODE,
+                                    lock_keys=[d for e in events for d in (e["start_date"], e["end_date"])])
+        except (AccountLimitError, WorkerPoolBusy) as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        for i, outcome in zip(positions, outcomes):
+            outcome["text"] = data.texts[i]
+            results[i] = outcome
+
+    created = sum(1 for r in results if r["status"] == "created")
+    return {
+        "status": "success" if created == len(results) else "partial",
+        "created": created,
+        "results": results
     }
 
-    print("[DEBUG] Response sent to frontend:", response)
-    return response
 
-#chrome_proc.terminate()     # or .kill()
-#chrome_proc.wait()
\ No newline at end of file
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job.to_dict()
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    if conversations.waiting_job(job.session_id) is not job or not conversations.cancel(job.session_id):
+        raise HTTPException(status_code=409, detail="job is not waiting for input")
+    return job.to_dict()
+
+
+@app.post("/jobs/{job_id}/accept")
+def accept_suggestion(job_id: str, data: AcceptSlotInput):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    suggestions = job.suggestions or []
+    if not 0 <= data.index < len(suggestions):
+        raise HTTPException(status_code=400, detail="no such suggestion")
+    if conversations.waiting_job(job.session_id) is not job:
+        raise HTTPException(status_code=409, detail="job is not waiting for input")
+    REQUESTS.inc(endpoint="/jobs/accept")
+    if conversations.reply(job.session_id, suggestions[data.index]) is None:
+        raise HTTPException(status_code=409, detail="job is not waiting for input")
+    return {"status": "resumed", "job_id": job.id}
+
+
+@app.websocket("/jobs/{job_id}/ws")
+async def stream_job(websocket: WebSocket, job_id: str):
+    await websocket.accept()
+    job = job_queue.get(job_id)
+    if job is None:
+        await websocket.send_json({"job_id": job_id, "status": "unknown"})
+        await websocket.close(code=4404)
+        return
+
+    updates = asyncio.Queue()
+    job.subscribe(asyncio.get_running_loop(), updates)
+    try:
+        while True:
+            snapshot = await updates.get()
+            await websocket.send_json(snapshot)
+            if snapshot["status"] in FINISHED_STATES:
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        job.unsubscribe(updates)
+
+
+@app.get("/audio/{phrase}")
+def get_phrase_audio(phrase: str, request: Request):
+    # Only the fixed prompt fragments are rendered; free text would tie up the single TTS engine
+    text = PROMPT_PHRASES.get(phrase)
+    if text is None:
+        raise HTTPException(status_code=404, detail="unknown phrase")
+
+    try:
+        key, path = audio_cache.get(text)
+    except Exception as e:
+        tracing.warn("Prompt audio unavailable", error=str(e))
+        raise HTTPException(status_code=503, detail="audio unavailable")
+
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="audio/wav", headers=headers)
+
+
+@app.get("/debug/trace/{request_id}")
+def get_trace(request_id: str):
+    """
+    Buffered trace records of one request id (X-Request-ID) or job id,
+    oldest first. A job's trace starts with the request that submitted it.
+    """
+    request_ids = [request_id]
+    job = job_queue.get(request_id)
+    if job is not None and job.request_id:
+        request_ids.append(job.request_id)
+    records = tracer.records(request_ids)
+    if not records:
+        raise HTTPException(status_code=404, detail="no trace records for this id")
+    return {"request_id": request_id, "records": records}
+
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/pool")
+def pool_status():
+    stats = chrome_workers.stats()
+    stats["jobs_pending"] = job_queue.pending()
+    stats["jobs_awaiting_input"] = conversations.pending()
+    stats["browser_ready"] = chrome_workers.is_ready()
+    stats["browser_startup_seconds"] = chrome_workers.startup_seconds
+    stats["wait_timeouts"] = waits.stats()
+    stats["accounts"] = accounts.stats()
+    stats["prefetch"] = scrape_cache.stats()
+    stats["idempotency"] = submissions.stats()
+    stats["event_store"] = event_store.stats()
+    stats["trace"] = tracer.stats()
+    return stats
\ No newline at end of file
@@ -0,0 +1,168 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# -------------------------
+# 指标类型
+# -------------------------
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, key, value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(s[0]), s[1], s[2]) for key, s in self._series.items()]
+        for key, bucket_counts, count, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, bucket_counts):
+                cumulative += n
+                yield self.name + "_bucket", key + (("le", _format_value(float(bound))),), cumulative
+            yield self.name + "_bucket", key + (("le", "+Inf"),), count
+            yield self.name + "_count", key, count
+            yield self.name + "_sum", key, total
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# -------------------------
+# 应用指标
+# -------------------------
+STAGE_SECONDS = REGISTRY.histogram(
+    "calendar_stage_seconds", "Time spent in each /speech pipeline stage.", ["stage"]
+)
+REQUESTS = REGISTRY.counter("speech_requests_total", "Requests received, by endpoint.", ["endpoint"])
+CONFLICTS = REGISTRY.counter("calendar_conflicts_total", "Requested slots that overlapped existing events.")
+LOGIN_WAITS = REGISTRY.counter("calendar_login_waits_total", "Times the flow had to wait for a manual Google login.")
+LOGIN_CHECKS = REGISTRY.counter(
+    "calendar_login_checks_total", "Login state lookups, answered from the cache or by a fresh verification.", ["result"]
+)
+FALLBACK_OPTION_PICKS = REGISTRY.counter(
+    "calendar_fallback_option_picks_total", "End times chosen by the fallback option scan instead of an exact match."
+)
+CREATE_MODE_FALLBACKS = REGISTRY.counter(
+    "calendar_create_mode_fallbacks_total", "Prefilled-URL creations that fell back to the form flow."
+)
+WAIT_SECONDS = REGISTRY.histogram(
+    "calendar_wait_seconds", "Time spent waiting for a page readiness signal, by step.", ["step"]
+)
+WORKER_RESTARTS = REGISTRY.counter("chrome_worker_restarts_total", "Chrome workers relaunched after their process exited.", ["worker"])
+WORKER_REJECTIONS = REGISTRY.counter("chrome_worker_rejections_total", "Calendar tasks refused because every Chrome worker was busy.")
+WAIT_TIMEOUTS = REGISTRY.counter("calendar_wait_timeouts_total", "Readiness waits that hit their timeout.", ["step"])
+IDEMPOTENCY_LOOKUPS = REGISTRY.counter(
+    "speech_idempotency_lookups_total", "Duplicate-submission cache lookups on /speech, by result (hit/miss).", ["result"]
+)
+PREFETCHES = REGISTRY.counter(
+    "calendar_prefetch_total", "Speculative day scrapes and their use, by outcome (started/failed/discarded/hit/miss).", ["outcome"]
+)
+
+
+def span(stage):
+    """Time a pipeline stage: `with span("parse_event"): ...`"""
+    return STAGE_SECONDS.time(stage=stage)
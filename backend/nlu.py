@@ -1,26 +1,73 @@
 import re
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
+# -------------------------
+# 静态表与预编译正则
+# -------------------------
+CN_NUM = {
+    '零': 0, '一': 1, '二': 2, '三': 3, '四': 4,
+    '五': 5, '六': 6, '七': 7, '八': 8, '九': 9, '十': 10
+}
+
+MINUTE_WORDS = {'半': 30, '一刻': 15, '三刻': 45}
+
+DAY_OFFSETS = {'今天': 0, '明天': 1, '后天': 2}
+
+PM_PERIODS = ('下午', '晚上')
+AM_PERIODS = ('上午', '凌晨', '早上')
+
+_PERIOD = r'上午|下午|早上|晚上|凌晨'
+_HOUR = r'[零一二三四五六七八九十\d]{1,2}'
+_MINUTE = r'半|一刻|三刻|(\d{1,2})分'
+
+PERIOD_RE = re.compile(f'({_PERIOD})')
+TIME_RE = re.compile(f'({_HOUR})点({_MINUTE})?')
+MINUTE_RE = re.compile(r'([零一二三四五六七八九十\d]{1,3})分')
+TITLE_NOISE_RE = re.compile(r"(有|安排|事件)")
+
+# 时间段：开始 (日期)(时段)X点(分钟) 到/至/- 结束 (时段)X点(分钟)
+RANGE_RE = re.compile(
+    f'(?P<start>(?P<date>今天|明天|后天|星期[一二三四五六日])?'
+    f'(?P<period>{_PERIOD})?'
+    f'(?P<hour>{_HOUR})点'
+    f'(?P<minute>{_MINUTE})?)'
+    r'\s*(到|至|-)\s*'
+    f'(?P<end>(?P<end_period>{_PERIOD})?'
+    f'(?P<end_hour>{_HOUR})点'
+    f'(?P<end_minute>{_MINUTE})?)'
+)
+
+# 单个时间点
+SINGLE_RE = re.compile(
+    f'(?P<start>(?P<date>今天|明天|后天|星期[一二三四五六七八九十\\d])?'
+    f'(?P<period>{_PERIOD})?'
+    f'(?P<hour>{_HOUR})点'
+    f'(?P<minute>{_MINUTE})?)'
+)
+
+PARSE_CACHE_SIZE = 1024
+# 缓存键忽略的差异：多余空白和句末标点
+WHITESPACE_RE = re.compile(r"\s+")
+TRAILING_PUNCT_RE = re.compile(r"[\s。．.！!？?，,、；;]+$")
+
+
 # -------------------------
 # 中文数字转换
 # -------------------------
 def chinese_to_digit(chinese_num):
-    cn_num = {
-        '零': 0, '一': 1, '二': 2, '三': 3, '四': 4,
-        '五': 5, '六': 6, '七': 7, '八': 8, '九': 9, '十': 10
-    }
-
     if chinese_num.isdigit():
         return int(chinese_num)
 
     if chinese_num == "十":
         return 10
     if chinese_num.startswith("十"):  # 11-19
-        return 10 + cn_num.get(chinese_num[1], 0)
+        return 10 + CN_NUM.get(chinese_num[1], 0)
     if "十" in chinese_num:  # 20-99
         left, right = chinese_num.split("十")
-        return cn_num.get(left, 0) * 10 + cn_num.get(right, 0)
-    return cn_num.get(chinese_num, 0)
+        return CN_NUM.get(left, 0) * 10 + CN_NUM.get(right, 0)
+    return CN_NUM.get(chinese_num, 0)
 
 
 def chinese_minute_to_digit(text):
@@ -33,110 +80,109 @@ def chinese_minute_to_digit(text):
     if "三刻" in text:
         return 45
 
-    m = re.search(r'([零一二三四五六七八九十\d]{1,3})分', text)
+    m = MINUTE_RE.search(text)
     if m:
         return chinese_to_digit(m.group(1))
     return 0
 
+
+def _adjust_hour(hour, period):
+    if period in PM_PERIODS and hour < 12:
+        return hour + 12
+    if period in AM_PERIODS and hour == 12:
+        return 0
+    return hour
+
+
+def _midnight(now, days):
+    return (now + timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
 # -------------------------
 # 解析单个时间点
 # -------------------------
-def parse_chinese_time(time_text: str, base_date=None, inherit_period=None):
-    now = datetime.now()
+def parse_chinese_time(time_text: str, base_date=None, inherit_period=None, now=None):
+    now = now or datetime.now()
     date = base_date or now
 
     # ---------- Normalize spaces ----------
     time_text = time_text.replace("\u3000", "").replace("\xa0", "").strip()
 
     # ---------- Detect date keyword ----------
-    if time_text.startswith("明天"):
-        date = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-        time_text = time_text[len("明天"):].lstrip()
-    elif time_text.startswith("后天"):
-        date = (now + timedelta(days=2)).replace(hour=0, minute=0, second=0, microsecond=0)
-        time_text = time_text[len("后天"):].lstrip()
-    elif time_text.startswith("今天"):
-        date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        time_text = time_text[len("今天"):].lstrip()
+    keyword = time_text[:2]
+    if keyword in DAY_OFFSETS:
+        date = _midnight(now, DAY_OFFSETS[keyword])
+        time_text = time_text[2:].lstrip()
 
     # ---------- Detect period ----------
-    m_period = re.search(r'(上午|下午|早上|晚上|凌晨)', time_text)
+    m_period = PERIOD_RE.search(time_text)
     period = m_period.group() if m_period else inherit_period
 
     # ---------- Extract hour and minute ----------
     hour, minute = 0, 0
-    m_time = re.search(r'([零一二三四五六七八九十\d]{1,2})点(半|一刻|三刻|(\d{1,2})分)?', time_text)
+    m_time = TIME_RE.search(time_text)
     if m_time:
-        hour_text = m_time.group(1)
-        hour = chinese_to_digit(hour_text)
+        hour = chinese_to_digit(m_time.group(1))
         minute = chinese_minute_to_digit(m_time.group(2))
 
     # ---------- Adjust hour for period ----------
-    if period:
-        if period in ["下午", "晚上"] and hour < 12:
-            hour += 12
-        if period in ["上午", "凌晨", "早上"] and hour == 12:
-            hour = 0
+    hour = _adjust_hour(hour, period)
 
     return datetime(date.year, date.month, date.day, hour, minute)
 
-# -------------------------
-# 解析事件
-# -------------------------
-def parse_event(text: str):
-    # ---------- Match time range ----------
-    time_range_pattern = (
-        r'((今天|明天|后天|星期[一二三四五六日])?'
-        r'(上午|下午|早上|晚上|凌晨)?'
-        r'[零一二三四五六七八九十\d]{1,2}点'
-        r'(半|一刻|三刻|(\d{1,2})分)?)'
-        r'\s*(到|至|-)\s*'
-        r'((上午|下午|早上|晚上|凌晨)?'
-        r'[零一二三四五六七八九十\d]{1,2}点'
-        r'(半|一刻|三刻|(\d{1,2})分)?)'
-    )
-
-    m = re.search(time_range_pattern, text)
-    if m:
-        start_text = m.group(1)
-        end_text = m.group(7)
 
-        # ---------- Period inheritance ----------
-        start_period_match = re.search(r'(上午|下午|早上|晚上|凌晨)', start_text)
-        start_period = start_period_match.group() if start_period_match else None
+def _token_time(m, prefix, date, period, now):
+    """
+    Build the datetime for one matched time token without re-scanning it.
 
-        start_dt = parse_chinese_time(start_text, inherit_period=start_period)
-        end_dt = parse_chinese_time(end_text, base_date=start_dt, inherit_period=start_period)
+    Equivalent to parse_chinese_time() on the token text: the date keyword,
+    period, hour and minute all come straight from the named groups.
+    """
+    hour_text = m.group(prefix + "hour")
+    minute_text = m.group(prefix + "minute")
 
-        # ---------- Prevent accidental cross-day ----------
-        if end_dt <= start_dt and not re.search(r'(明天|后天|星期)', end_text):
-            # do not automatically cross day
-            pass
+    date_word = m.group("date") if not prefix else None
+    if date_word in DAY_OFFSETS:
+        date = _midnight(now, DAY_OFFSETS[date_word])
+    elif date_word and not m.group("period"):
+        # "星期X" is not a date keyword, so the numeral X is scanned as part
+        # of the hour ("星期三三点" reads "三三"); keep that behaviour.
+        m_time = TIME_RE.search(m.group("start"))
+        hour_text, minute_text = m_time.group(1), m_time.group(2)
 
-        title = text.replace(m.group(), "").strip()
+    hour = chinese_to_digit(hour_text)
+    if not minute_text:
+        minute = 0
     else:
-        # ---------- Single time ----------
-        single_time_pattern = (
-            r'((今天|明天|后天|星期[一二三四五六七八九十\d])?'
-            r'(上午|下午|早上|晚上|凌晨)?'
-            r'[零一二三四五六七八九十\d]{1,2}点'
-            r'(半|一刻|三刻|(\d{1,2})分)?)'
-        )
-        m2 = re.search(single_time_pattern, text)
-        if m2:
-            start_period_match = re.search(r'(上午|下午|早上|晚上|凌晨)', m2.group())
-            start_period = start_period_match.group() if start_period_match else None
-
-            start_dt = parse_chinese_time(m2.group(1), inherit_period=start_period)
-            end_dt = start_dt + timedelta(hours=1)
-            title = text.replace(m2.group(), "").strip()
-        else:
-            start_dt = datetime.now()
-            end_dt = start_dt + timedelta(hours=1)
-            title = text
+        minute = MINUTE_WORDS.get(minute_text)
+        if minute is None:
+            minute = chinese_minute_to_digit(minute_text)
+
+    hour = _adjust_hour(hour, period)
+    return datetime(date.year, date.month, date.day, hour, minute)
+
+
+def _parse_times(text, now):
+    """Return (start_dt, end_dt, matched_text), or None when no time is found."""
+    m = RANGE_RE.search(text)
+    if m:
+        start_period = m.group("period")
+        start_dt = _token_time(m, "", now, start_period, now)
+        end_dt = _token_time(m, "end_", start_dt, m.group("end_period") or start_period, now)
+        # do not automatically cross day
+        return start_dt, end_dt, m.group()
 
+    m = SINGLE_RE.search(text)
+    if m:
+        start_dt = _token_time(m, "", now, m.group("period"), now)
+        return start_dt, start_dt + timedelta(hours=1), m.group()
+
+    return None
+
+
+def _build_event(text, start_dt, end_dt, title):
     # ---------- Clean title ----------
-    title = re.sub(r"(有|安排|事件)", "", title).strip()
+    title = TITLE_NOISE_RE.sub("", title).strip()
     if not title:
         title = "语音日程"
 
@@ -148,3 +194,89 @@ def parse_event(text: str):
         "end_time": end_dt.strftime("%H:%M"),
         "description": text
     }
+
+
+# -------------------------
+# 解析结果缓存
+# -------------------------
+class _ParseCache:
+    """Bounded LRU of parse results keyed on (text, reference date)."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+parse_cache = _ParseCache(PARSE_CACHE_SIZE)
+
+
+def normalize_utterance(text):
+    """text as parse_cache sees it: one space between words, no closing punctuation."""
+    return TRAILING_PUNCT_RE.sub("", WHITESPACE_RE.sub(" ", text.strip()))
+
+
+# -------------------------
+# 解析事件
+# -------------------------
+def parse_event(text: str, now=None):
+    """
+    Parse a Chinese scheduling utterance into an event dict.
+
+    Results depend only on the text and today's date, so they are memoized
+    in parse_cache, keyed on the text with surrounding whitespace, repeated
+    whitespace and closing punctuation normalized away; utterances without
+    any time fall back to the current moment and are not cached. now
+    overrides the reference time. description is always the text as given.
+    """
+    now = now or datetime.now()
+    normalized = normalize_utterance(text)
+    key = (normalized, now.date())
+
+    cached = parse_cache.get(key)
+    if cached is not None:
+        return dict(cached, description=text)
+
+    times = _parse_times(normalized, now)
+    if times is None:
+        # ---------- No time found ----------
+        return _build_event(text, now, now + timedelta(hours=1), text)
+
+    start_dt, end_dt, matched = times
+    event = _build_event(text, start_dt, end_dt, normalized.replace(matched, "").strip())
+    parse_cache.put(key, event)
+    return dict(event)
+
+
+def parse_start_date(text, now=None):
+    """
+    Start date (YYYY-MM-DD) mentioned in text, or None while it has no time yet.
+
+    Meant for interim transcripts, so nothing is added to parse_cache.
+    """
+    times = _parse_times(text, now or datetime.now())
+    return times[0].strftime("%Y-%m-%d") if times else None
@@ -0,0 +1,153 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from accounts import DEFAULT_ACCOUNT
+from metrics import PREFETCHES
+import tracing
+
+
+# -------------------------
+# 预取的日程索引缓存
+# -------------------------
+class ScrapeCache:
+    """
+    Day indexes (date -> ConflictIndex) scraped ahead of time, per account.
+
+    prefetch() runs loader() on a small thread pool while the user is still
+    speaking; loader returns whatever days it scraped (a week view gives
+    seven). The job that follows wait()s for a prefetch still in flight,
+    then lookup()s the fresh days under its date locks instead of scraping
+    them again.
+
+    Creating an event makes the cached days stale: invalidate() drops them
+    and bumps the account's generation, and a prefetch that started before
+    the bump throws its result away. Entries also expire after ttl seconds,
+    which bounds how long edits made outside this app go unseen.
+    """
+
+    def __init__(self, ttl=60, workers=2):
+        self.ttl = ttl
+        self._entries = {}
+        self._inflight = {}
+        self._generation = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+
+    def _fresh(self, key, now):
+        entry = self._entries.get(key)
+        return entry is not None and now - entry[1] < self.ttl
+
+    def prefetch(self, account_id, date, loader):
+        """Start loading date unless it is cached or already on its way; True if started."""
+        account_id = account_id or DEFAULT_ACCOUNT
+        key = (account_id, date)
+        now = time.monotonic()
+        with self._lock:
+            for stale in [k for k in self._entries if not self._fresh(k, now)]:
+                del self._entries[stale]
+            if key in self._inflight or self._fresh(key, now):
+                return False
+            future = Future()
+            self._inflight[key] = future
+            generation = self._generation.get(account_id, 0)
+        PREFETCHES.inc(outcome="started")
+        tracing.debug("Prefetching", date=date, account=account_id)
+        self._executor.submit(contextvars.copy_context().run, self._load, key, loader, generation, future)
+        return True
+
+    def _load(self, key, loader, generation, future):
+        account_id, date = key
+        try:
+            indexes = loader()
+        except Exception as e:
+            PREFETCHES.inc(outcome="failed")
+            tracing.warn("Prefetch failed", date=date, error=repr(e))
+            indexes = {}
+        now = time.monotonic()
+        with self._lock:
+            if self._generation.get(account_id, 0) != generation:
+                PREFETCHES.inc(outcome="discarded")
+                tracing.debug("Prefetch discarded, events were created meanwhile", date=date)
+            else:
+                for day, index in indexes.items():
+                    self._entries[(account_id, day)] = (index, now)
+            del self._inflight[key]
+        future.set_result(None)
+
+    def wait(self, account_id, dates, timeout):
+        """Block up to timeout seconds for prefetches of dates that are still running."""
+        account_id = account_id or DEFAULT_ACCOUNT
+        with self._lock:
+            futures = [self._inflight[(account_id, d)] for d in dates if (account_id, d) in self._inflight]
+        if futures:
+            wait(futures, timeout=timeout)
+
+    def lookup(self, account_id, dates):
+        """A new date -> ConflictIndex dict with every fresh cached day among dates."""
+        account_id = account_id or DEFAULT_ACCOUNT
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for date in dates:
+                if self._fresh((account_id, date), now):
+                    found[date] = self._entries[(account_id, date)][0]
+        for date in dates:
+            PREFETCHES.inc(outcome="hit" if date in found else "miss")
+        return found
+
+    def invalidate(self, account_id, dates):
+        account_id = account_id or DEFAULT_ACCOUNT
+        with self._lock:
+            self._generation[account_id] = self._generation.get(account_id, 0) + 1
+            for date in dates:
+                self._entries.pop((account_id, date), None)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "cached_days": sum(1 for key in self._entries if self._fresh(key, now)),
+                "inflight": len(self._inflight),
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# -------------------------
+# 中间识别结果的日期跟踪
+# -------------------------
+class InterimDateTracker:
+    """
+    Decides when the date in a growing interim transcript is worth prefetching.
+
+    parse(text) returns the start date a text mentions or None. observe()
+    feeds it each interim text; once the same date came out of stable_count
+    texts in a row it is returned, once per date.
+    """
+
+    def __init__(self, parse, stable_count=2):
+        self.parse = parse
+        self.stable_count = stable_count
+        self.reset()
+
+    def reset(self):
+        self._date = None
+        self._count = 0
+        self._reported = set()
+
+    def observe(self, text):
+        date = self.parse(text)
+        if date is None:
+            self._date, self._count = None, 0
+            return None
+        if date == self._date:
+            self._count += 1
+        else:
+            self._date, self._count = date, 1
+        if self._count >= self.stable_count and date not in self._reported:
+            self._reported.add(date)
+            return date
+        return None
@@ -0,0 +1,133 @@
+import threading
+import time
+
+import tracing
+from metrics import span, LOGIN_CHECKS
+
+# Google 登录会话的 cookie（任一存在且未过期即视为已登录）
+LOGIN_COOKIE_URL = "https://accounts.google.com"
+LOGIN_COOKIE_NAMES = ("SID", "__Secure-1PSID", "__Secure-3PSID")
+
+
+class LoginRequired(RuntimeError):
+    """A calendar page was redirected to the Google sign-in page."""
+
+
+def has_login_cookies(cookies, now=None):
+    now = now or time.time()
+    return any(
+        c["name"] in LOGIN_COOKIE_NAMES and (c.get("expires", -1) == -1 or c["expires"] > now)
+        for c in cookies
+    )
+
+
+def redirected_to_login(page):
+    # page.url is known locally, so this costs no CDP round trip
+    return "accounts.google.com" in page.url
+
+
+def login_page_shown(page):
+    return bool(page.query_selector('input[type="email"]')) or redirected_to_login(page)
+
+
+# -------------------------
+# 登录状态缓存
+# -------------------------
+class LoginState:
+    """
+    Cached Google login state of one browser, shared by all its page slots.
+
+    is_logged_in() answers from the cache while a positive verification is
+    younger than ttl, so the common path costs no CDP call at all. A
+    verification reads the session cookies of the page's context (one CDP
+    call, no navigation); when none are there, e.g. against a stand-in
+    calendar, it falls back to looking for the sign-in form on the page.
+
+    While logged out, the first waiting job polls the cookies every
+    poll_interval and everyone else sleeps until it (or an idle page slot
+    running refresh_if_due) sees the login again and wakes them up.
+    """
+
+    def __init__(self, ttl=300, poll_interval=1.0):
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.logged_in = None
+        self.verified_at = 0.0
+        self.verifications = 0
+        self._watching = False
+        self._cond = threading.Condition()
+
+    def _age(self):
+        return time.monotonic() - self.verified_at
+
+    def verify(self, page):
+        """Check the login on page's browser now and record the answer."""
+        self.verifications += 1
+        with span("login_check"):
+            try:
+                if has_login_cookies(page.context.cookies(LOGIN_COOKIE_URL)):
+                    logged_in = True
+                else:
+                    logged_in = not login_page_shown(page)
+            except Exception as e:
+                # The sign-in flow navigated mid-check
+                tracing.debug("Login check inconclusive", error=str(e))
+                logged_in = False
+        self.record(logged_in)
+        return logged_in
+
+    def record(self, logged_in):
+        with self._cond:
+            changed = logged_in != self.logged_in
+            self.logged_in = logged_in
+            self.verified_at = time.monotonic()
+            if logged_in:
+                self._cond.notify_all()
+        if changed:
+            tracing.info("Google login state changed", logged_in=logged_in)
+
+    def is_logged_in(self, page):
+        if self.logged_in and self._age() < self.ttl:
+            LOGIN_CHECKS.inc(result="cached")
+            return True
+        LOGIN_CHECKS.inc(result="verified")
+        return self.verify(page)
+
+    def refresh_if_due(self, page):
+        """Re-verify from an idle page slot before the cached answer runs out."""
+        if not self.logged_in or self._age() > self.ttl / 2:
+            self.verify(page)
+
+    def await_login(self, page, timeout):
+        """Block until the browser is logged in or timeout passes; True once logged in."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self.logged_in:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if self._watching:
+                    self._cond.wait_for(lambda: self.logged_in or not self._watching, remaining)
+                    continue
+                self._watching = True
+            try:
+                while True:
+                    if self.verify(page):
+                        return True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    time.sleep(min(self.poll_interval, remaining))
+            finally:
+                with self._cond:
+                    self._watching = False
+                    self._cond.notify_all()
+
+    def stats(self):
+        return {
+            "logged_in": self.logged_in,
+            "verified_seconds_ago": round(self._age(), 1) if self.verified_at else None,
+            "verifications": self.verifications,
+        }
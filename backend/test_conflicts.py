@@ -0,0 +1,76 @@
+from conflicts import (
+    ConflictIndex, Interval, DAY_MINUTES, decode_datekey, event_conflicts, nearest_free_slots,
+    parse_button_texts, week_indexes, week_intervals,
+)
+
+
+def event(start_date, start_time, end_time, title="new"):
+    return {"title": title, "start_date": start_date, "start_time": start_time, "end_time": end_time}
+
+
+def test_overlap_is_half_open():
+    index = ConflictIndex([Interval(600, 660, "a")])
+    assert not index.has_conflict(660, 720)
+    assert not index.has_conflict(540, 600)
+    assert index.conflicts(659, 700) == [Interval(600, 660, "a")]
+    assert index.has_conflict("09:30", "10:01")
+
+
+def test_conflicts_lists_every_overlap_once_in_order():
+    index = ConflictIndex([Interval(540, 1020, "long"), Interval(600, 630, "short"), Interval(700, 760, "later")])
+    assert [c.text for c in index.conflicts(610, 710)] == ["long", "short", "later"]
+
+
+def test_button_texts_are_parsed_from_the_last_line():
+    texts = ["Standup to team\n9 – 9:30am", "All day", "Dinner to go\n11pm – 1am"]
+    assert parse_button_texts(texts) == [
+        Interval(540, 570, texts[0]),
+        Interval(23 * 60, DAY_MINUTES + 60, texts[2]),
+    ]
+
+
+def test_overnight_event_blocks_the_early_morning_from_the_day_view():
+    # The day view cannot tell whether an overnight chip started today or yesterday
+    index = ConflictIndex([Interval(23 * 60, DAY_MINUTES + 60, "night")])
+    assert index.has_conflict(30, 90)
+    assert index.has_conflict(23 * 60 + 30, DAY_MINUTES)
+
+
+def test_overnight_event_is_checked_on_the_next_day():
+    indexes = {
+        "2025-01-06": ConflictIndex(shift_overnight=False),
+        "2025-01-07": ConflictIndex([Interval(30, 90, "early")], shift_overnight=False),
+    }
+    assert [c.text for c in event_conflicts(indexes, event("2025-01-06", "23:00", "01:00"))] == ["early"]
+    assert event_conflicts(indexes, event("2025-01-06", "22:00", "23:00")) == []
+
+
+def test_decode_datekey():
+    assert decode_datekey((2025 - 1970) << 9 | 1 << 5 | 6) == "2025-01-06"
+    assert decode_datekey(str((2024 - 1970) << 9 | 12 << 5 | 31)) == "2024-12-31"
+
+
+def test_week_columns_place_overnight_events_on_the_right_days():
+    night = Interval(23 * 60, DAY_MINUTES + 60, "night")
+    columns = {"2025-01-05": [], "2025-01-06": [night], "2025-01-07": [night]}
+    intervals = week_intervals(columns)
+    assert intervals["2025-01-06"] == [night]
+    # The second chip is the continuation: only its after-midnight part is busy
+    assert intervals["2025-01-07"] == [Interval(-60, 60, "night")]
+
+    indexes = week_indexes(columns)
+    assert indexes["2025-01-07"].has_conflict(0, 30)
+    assert not indexes["2025-01-07"].has_conflict(23 * 60, DAY_MINUTES)
+
+
+def test_first_week_column_keeps_both_readings():
+    night = Interval(23 * 60, DAY_MINUTES + 60, "night")
+    assert week_intervals({"2025-01-05": [night]})["2025-01-05"] == [night, Interval(-60, 60, "night")]
+
+
+def test_nearest_free_slots():
+    index = ConflictIndex([Interval(540, 600, "a"), Interval(630, 720, "b")])
+    # 09:00-18:00, one hour wanted at 09:00: the 30 minute gap at 10:00 is too short
+    assert nearest_free_slots(index, 60, 540, 540, 1080) == [(720, 780)]
+    assert nearest_free_slots(index, 30, 540, 540, 1080) == [(600, 630), (720, 750)]
+    assert nearest_free_slots(ConflictIndex(), 60, 1050, 540, 1080) == [(1020, 1080)]
@@ -0,0 +1,94 @@
+import re
+
+
+def time_to_minutes(time_str):
+    """Convert time string like '10:00am', '14:30', or '2pm' to minutes since midnight"""
+    time_str = time_str.strip().lower()
+
+    # Remove spaces
+    time_str = time_str.replace(" ", "")
+
+    # Match hour:minute
+    match = re.match(r'(\d{1,2})(?::(\d{2}))?(am|pm)?', time_str)
+    if not match:
+        return 0  # fallback
+
+    hour = int(match.group(1))
+    minute = int(match.group(2)) if match.group(2) else 0
+    meridiem = match.group(3)
+
+    if meridiem == "pm" and hour != 12:
+        hour += 12
+    if meridiem == "am" and hour == 12:
+        hour = 0
+
+    return hour * 60 + minute
+
+
+def normalize_event(start_str, end_str):
+    start_min = time_to_minutes(start_str)
+    end_min = time_to_minutes(end_str)
+    if end_min <= start_min:
+        end_min += 24*60  # handle overnight events
+    return start_min, end_min
+
+def convert_ampm_to_24h(time_str):
+    """
+    Converts a time string like '11pm' or '7:30am' into 'HH:MM' 24-hour format.
+    """
+    time_str = time_str.strip().lower()
+
+    # Separate the number part from am/pm
+    if time_str.endswith('am') or time_str.endswith('pm'):
+        ampm = time_str[-2:]
+        time_part = time_str[:-2].strip()
+    else:
+        raise ValueError(f"Time must end with 'am' or 'pm': '{time_str}'")
+    
+    # Handle hours and optional minutes
+    if ':' in time_part:
+        hours, minutes = map(int, time_part.split(':'))
+    else:
+        hours = int(time_part)
+        minutes = 0
+    
+    # Convert to 24-hour time
+    if ampm == 'am' and hours == 12:
+        hours = 0
+    elif ampm == 'pm' and hours != 12:
+        hours += 12
+    
+    return f"{hours:02d}:{minutes:02d}"
+
+
+def convert_range_to_24h(range_str):
+    """
+    Converts a range like '3-4pm', '3pm-4', or '3 – 4pm'
+    into start and end in 'HH:MM' 24-hour format.
+    """
+    # Normalize dash symbols
+    range_str = range_str.replace('–', '-').replace('—', '-')
+
+    if '-' not in range_str:
+        raise ValueError(f"Invalid range format: '{range_str}'")
+
+    start_part, end_part = map(str.strip, range_str.split('-'))
+
+    start_lower = start_part.lower()
+    end_lower = end_part.lower()
+
+    start_has_ampm = start_lower.endswith(('am', 'pm'))
+    end_has_ampm = end_lower.endswith(('am', 'pm'))
+
+    # If only end has am/pm → append to start
+    if not start_has_ampm and end_has_ampm:
+        start_part += end_part[-2:]
+
+    # If only start has am/pm → append to end
+    if start_has_ampm and not end_has_ampm:
+        end_part += start_part[-2:]
+
+    start_24 = convert_ampm_to_24h(start_part)
+    end_24 = convert_ampm_to_24h(end_part)
+
+    return start_24, end_24
@@ -0,0 +1,200 @@
+import contextvars
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warn": WARN, "error": ERROR}
+LEVEL_NAMES = {value: name.upper() for name, value in LEVELS.items()}
+
+
+def parse_level(name):
+    try:
+        return LEVELS[name.strip().lower()]
+    except KeyError:
+        raise ValueError(f"trace level must be one of {tuple(LEVELS)}, got {name!r}") from None
+
+
+# 记录到内存环形缓冲区的最低级别（更低的级别直接丢弃），以及由后台线程写到标准输出的最低级别
+TRACE_LEVEL = parse_level(os.getenv("TRACE_LEVEL", "debug"))
+TRACE_OUTPUT_LEVEL = parse_level(os.getenv("TRACE_OUTPUT_LEVEL", "info"))
+# 环形缓冲区保留的记录条数
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "10000"))
+
+# Client supplied X-Request-ID values are only kept when they look like an id
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+_request_id = contextvars.ContextVar("trace_request_id", default=None)
+
+_STOP = object()
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id):
+    """Tag every record made inside the block (and in tasks it hands off) with request_id."""
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
+
+
+def _jsonable(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    return repr(value)
+
+
+def _format(record):
+    at, level, request_id, thread, message, fields = record
+    line = f"[{LEVEL_NAMES[level]}] {message}"
+    if fields:
+        line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+    if request_id:
+        line += f" (request {request_id[:8]})"
+    return line
+
+
+# -------------------------
+# 追踪记录缓冲区
+# -------------------------
+class Tracer:
+    """
+    Structured trace records in a fixed-size in-memory ring buffer.
+
+    A record is (time, level, request id, thread name, message, fields);
+    the request id comes from the request_context() the caller runs in.
+    Records below level are dropped before anything is built, so a disabled
+    level costs one comparison. Records at output_level or above are also
+    handed to a background thread that formats and writes them to stdout,
+    keeping console I/O off the request and page threads.
+    """
+
+    def __init__(self, level=DEBUG, output_level=INFO, size=10000, stream=None):
+        self.level = level
+        self.output_level = output_level
+        self.size = size
+        self.stream = stream or sys.stdout
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._pending = queue.SimpleQueue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, message, fields):
+        if level < self.level:
+            return
+        record = (time.time(), level, _request_id.get(), threading.current_thread().name, message, fields)
+        with self._lock:
+            self._records.append(record)
+        if level >= self.output_level:
+            if self._writer is None:
+                self._start_writer()
+            self._pending.put(record)
+
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is not None:
+                return
+            self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            record = self._pending.get()
+            if record is _STOP:
+                break
+            try:
+                self.stream.write(_format(record) + "\n")
+                if self._pending.empty():
+                    self.stream.flush()
+            except Exception:
+                # Nowhere left to report a broken stdout
+                pass
+
+    def records(self, request_ids):
+        """Buffered records of the given request ids, oldest first, as JSON-ready dicts."""
+        request_ids = set(request_ids)
+        with self._lock:
+            matching = [r for r in self._records if r[2] in request_ids]
+        return [
+            {
+                "at": at,
+                "level": LEVEL_NAMES[level],
+                "request_id": request_id,
+                "thread": thread,
+                "message": message,
+                "fields": _jsonable(fields),
+            }
+            for at, level, request_id, thread, message, fields in matching
+        ]
+
+    def stats(self):
+        return {
+            "level": LEVEL_NAMES[self.level],
+            "output_level": LEVEL_NAMES[self.output_level],
+            "buffered": len(self._records),
+            "size": self.size,
+        }
+
+    def close(self, timeout=5):
+        """Write out what is still pending."""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        self._pending.put(_STOP)
+        writer.join(timeout=timeout)
+
+
+tracer = Tracer(TRACE_LEVEL, TRACE_OUTPUT_LEVEL, TRACE_BUFFER_SIZE)
+
+
+def enabled(level):
+    """Guard for fields that are expensive to compute."""
+    return level >= tracer.level
+
+
+def debug(message, **fields):
+    if DEBUG >= tracer.level:
+        tracer.log(DEBUG, message, fields)
+
+
+def info(message, **fields):
+    if INFO >= tracer.level:
+        tracer.log(INFO, message, fields)
+
+
+def warn(message, **fields):
+    if WARN >= tracer.level:
+        tracer.log(WARN, message, fields)
+
+
+def error(message, **fields):
+    if ERROR >= tracer.level:
+        tracer.log(ERROR, message, fields)
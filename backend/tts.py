@@ -0,0 +1,134 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import pyttsx3
+
+import tracing
+
+# 优先级：数字越小越先播报
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+_STOP = object()
+
+
+def pick_zh_voice(engine):
+    """Return the id of the first installed voice that speaks Chinese, or None."""
+    for v in engine.getProperty('voices'):
+        if "zh" in v.id.lower() or "chinese" in v.name.lower():
+            tracing.debug("Using Chinese voice", voice=v.name)
+            return v.id
+    tracing.warn("No Chinese voice found, using default")
+    return None
+
+
+class TTSWorker:
+    """
+    Single background thread that owns the pyttsx3 engine.
+
+    The engine is created and the zh voice resolved once, on the worker
+    thread. Callers only enqueue: say() returns immediately. A message that
+    is already waiting is not queued again, and a cooldown can suppress
+    repeats of a message that was spoken recently.
+    """
+
+    def __init__(self):
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._pending = set()
+        self._last_spoken = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.engine = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="tts-worker", daemon=True)
+            self._thread.start()
+
+    def say(self, message, priority=PRIORITY_NORMAL, cooldown=0):
+        """Queue message for speaking. Returns False if it was dropped as a duplicate."""
+        self.start()
+        now = time.monotonic()
+        with self._lock:
+            if message in self._pending:
+                return False
+            if cooldown and now - self._last_spoken.get(message, float("-inf")) < cooldown:
+                return False
+            self._pending.add(message)
+        self._queue.put((priority, next(self._seq), message))
+        return True
+
+    def call(self, func, priority=PRIORITY_LOW):
+        """
+        Run func(engine) on the worker thread, since pyttsx3 is not
+        thread-safe, and return a Future with its result.
+        """
+        self.start()
+        future = Future()
+        self._queue.put((priority, next(self._seq), (func, future)))
+        return future
+
+    def close(self, timeout=5):
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put((PRIORITY_HIGH - 1, next(self._seq), _STOP))
+        thread.join(timeout=timeout)
+        self._thread = None
+
+    def _init_engine(self):
+        tracing.debug("Initializing TTS engine")
+        engine = pyttsx3.init()
+        zh_voice = pick_zh_voice(engine)
+        if zh_voice:
+            engine.setProperty('voice', zh_voice)
+        return engine
+
+    def _run(self):
+        try:
+            self.engine = self._init_engine()
+        except Exception as e:
+            tracing.warn("TTS engine unavailable, messages will not be spoken", error=str(e))
+
+        while True:
+            _, _, item = self._queue.get()
+            if item is _STOP:
+                break
+
+            if isinstance(item, tuple):
+                func, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if self.engine is None:
+                        raise RuntimeError("TTS engine unavailable")
+                    future.set_result(func(self.engine))
+                except Exception as e:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self._pending.discard(item)
+                self._last_spoken[item] = time.monotonic()
+            if self.engine is None:
+                continue
+            tracing.debug("Speaking message", message=item)
+            try:
+                self.engine.say(item)
+                self.engine.runAndWait()
+            except Exception as e:
+                tracing.warn("TTS failed", error=str(e))
+
+
+tts_worker = TTSWorker()
+
+
+def speak(message, priority=PRIORITY_NORMAL, cooldown=0):
+    return tts_worker.say(message, priority=priority, cooldown=cooldown)
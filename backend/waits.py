@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import deque
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+import tracing
+from metrics import WAIT_SECONDS, WAIT_TIMEOUTS
+
+# 自适应超时参数（秒）
+DEFAULT_TIMEOUT = 10.0
+MIN_TIMEOUT = 2.0
+MAX_TIMEOUT = 30.0
+TIMEOUT_FACTOR = 3.0
+WINDOW = 50
+MIN_SAMPLES = 5
+# 事件网格内按钮数量保持不变多久才算渲染完成（毫秒）
+GRID_QUIET_MS = 150
+
+GRID_SETTLED_JS = """
+(quietMs) => {
+    const grid = document.querySelector('[role="grid"]');
+    if (!grid) return false;
+    const count = grid.querySelectorAll('[role="button"]').length;
+    const now = performance.now();
+    const watch = window.__gridWatch || (window.__gridWatch = {count: -1, since: now});
+    if (watch.count !== count) {
+        watch.count = count;
+        watch.since = now;
+        return false;
+    }
+    return now - watch.since >= quietMs;
+}
+"""
+
+
+# -------------------------
+# 自适应等待
+# -------------------------
+class AdaptiveWaits:
+    """
+    Per-step timeouts learned from recently observed wait durations.
+
+    Each step keeps the last `window` durations; its timeout is the p95 of
+    those times `factor`, clamped to [min_timeout, max_timeout]. Until a
+    step has `min_samples` observations the default timeout applies. A wait
+    that times out is recorded at its full timeout, so a page that turned
+    slow widens the next timeout instead of failing repeatedly. Best-effort
+    waits are only recorded when they succeed.
+    """
+
+    def __init__(self, default_timeout=DEFAULT_TIMEOUT, min_timeout=MIN_TIMEOUT,
+                 max_timeout=MAX_TIMEOUT, factor=TIMEOUT_FACTOR, window=WINDOW,
+                 min_samples=MIN_SAMPLES):
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def timeout(self, step):
+        """Current timeout for step, in seconds."""
+        with self._lock:
+            samples = sorted(self._samples.get(step, ()))
+        if len(samples) < self.min_samples:
+            return self.default_timeout
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.factor))
+
+    def observe(self, step, seconds):
+        with self._lock:
+            samples = self._samples.get(step)
+            if samples is None:
+                samples = self._samples[step] = deque(maxlen=self.window)
+            samples.append(seconds)
+        WAIT_SECONDS.observe(seconds, step=step)
+
+    def wait(self, step, func, required=True, max_timeout=None):
+        """
+        Call func(timeout_ms) and record how long it took.
+
+        A timeout is re-raised when required, otherwise it is logged and
+        False is returned (for best-effort signals such as network idle).
+        """
+        timeout = self.timeout(step)
+        if max_timeout is not None:
+            timeout = min(timeout, max_timeout)
+        started = time.perf_counter()
+        try:
+            func(int(timeout * 1000))
+        except PlaywrightTimeoutError:
+            WAIT_TIMEOUTS.inc(step=step)
+            if required:
+                self.observe(step, timeout)
+                raise
+            tracing.debug("Wait gave up", step=step, timeout=round(timeout, 1))
+            return False
+        self.observe(step, time.perf_counter() - started)
+        return True
+
+    def stats(self):
+        with self._lock:
+            steps = list(self._samples)
+        return {step: round(self.timeout(step), 2) for step in steps}
+
+
+waits = AdaptiveWaits()
+
+
+# -------------------------
+# 页面就绪信号
+# -------------------------
+def goto(page, url, step="navigation"):
+    """
+    Navigate and wait for the DOM only. Calendar keeps long-lived sync
+    requests open, so network idle may never come; callers wait for the
+    element they need instead (wait_for_grid, wait_visible).
+    """
+    waits.wait(step, lambda ms: page.goto(url, wait_until="domcontentloaded", timeout=ms))
+
+
+def wait_for_grid(page):
+    """Day/week view populated: the event grid exists and its buttons stopped changing."""
+    page.evaluate("delete window.__gridWatch")
+    waits.wait("grid", lambda ms: page.wait_for_function(GRID_SETTLED_JS, arg=GRID_QUIET_MS, timeout=ms))
+
+
+def wait_visible(step, locator):
+    """Wait until locator (a dialog, menu item or button) is visible."""
+    waits.wait(step, lambda ms: locator.wait_for(state="visible", timeout=ms))
+    return locator
+
+
+def wait_hidden(step, locator):
+    """Wait until locator went away (a dialog closed or the page navigated off)."""
+    waits.wait(step, lambda ms: locator.wait_for(state="hidden", timeout=ms))
+
+
+def wait_for_options(page):
+    """A combobox list is open and has rendered its options."""
+    return wait_visible("options", page.get_by_role("option").first)
+
+
+def wait_for_url(page, step, predicate):
+    waits.wait(step, lambda ms: page.wait_for_url(predicate, timeout=ms))
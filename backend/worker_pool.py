@@ -0,0 +1,300 @@
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from browser_launcher import ChromeLauncher, BrowserLaunchError
+from browser_session import CalendarPagePool
+import tracing
+from metrics import WORKER_RESTARTS, WORKER_REJECTIONS
+
+# 复制登录配置目录时跳过 Chrome 的锁文件
+PROFILE_COPY_IGNORE = shutil.ignore_patterns("Singleton*", "lockfile", "*.lock", "Crashpad")
+# 最多记住多少个亲和键（账户 / 会话）到工作进程的映射
+MAX_AFFINITY_KEYS = 1000
+
+
+class WorkerPoolBusy(RuntimeError):
+    """Every Chrome worker is busy and the wait queue is full."""
+
+
+class WorkerPoolUnavailable(WorkerPoolBusy):
+    """No Chrome worker is healthy, so waiting for a free page would never end."""
+
+
+def workers_for_cpus(per_cpu, cpu_count=None):
+    return max(1, int((cpu_count or os.cpu_count() or 1) * per_cpu))
+
+
+def worker_profile_dir(base_dir, index):
+    return base_dir if index == 0 else f"{base_dir}-{index}"
+
+
+def seed_profile(source, target):
+    """Start a new worker profile as a copy of the logged-in one, if it has none yet."""
+    if os.path.exists(target) or not os.path.isdir(source):
+        return False
+    tracing.debug("Seeding Chrome profile", target=target, source=source)
+    shutil.copytree(source, target, ignore=PROFILE_COPY_IGNORE)
+    return True
+
+
+# -------------------------
+# 单个 Chrome 工作进程
+# -------------------------
+class ChromeWorker:
+    def __init__(self, index, launcher, pool):
+        self.index = index
+        self.launcher = launcher
+        self.pool = pool
+        self.capacity = pool.size
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+        self.healthy = True
+        self.started_at = time.monotonic()
+
+    @property
+    def load(self):
+        return self.active / self.capacity
+
+    def stats(self):
+        uptime = time.monotonic() - self.started_at
+        return {
+            "port": self.launcher.port,
+            "profile_dir": self.launcher.user_data_dir,
+            "healthy": self.healthy,
+            "active": self.active,
+            "capacity": self.capacity,
+            "completed": self.completed,
+            "failed": self.failed,
+            "restarts": self.restarts,
+            "utilization": round(self.busy_seconds / (uptime * self.capacity), 3) if uptime else 0.0,
+            "pool": self.pool.stats(),
+        }
+
+
+# -------------------------
+# Chrome 工作进程池和调度器
+# -------------------------
+class ChromeWorkerPool:
+    """
+    N supervised Chrome instances, each with its own port, profile and page pool.
+
+    run() dispatches func(page, *args, **kwargs) to a worker: requests with
+    an affinity key (account or session id) go back to the worker that served
+    the key before while it is healthy and has a free page, everything else
+    goes to the least-loaded healthy worker. When every page is busy callers
+    queue up to max_waiting deep; beyond that run() raises WorkerPoolBusy so
+    the API can answer 503 instead of piling up work. A wait ends after
+    acquire_timeout seconds at most, and nobody waits while no worker is
+    healthy (WorkerPoolUnavailable).
+
+    A supervisor thread relaunches Chrome instances whose process exited.
+    Worker 0 uses profile_dir; the others use profile_dir-<n>, seeded from
+    worker 0's profile the first time so they share its Google login.
+    """
+
+    def __init__(self, size, profile_dir, port_base, binary=None, headless=False,
+                 startup_timeout=30, pages_per_worker=2, max_waiting=None,
+                 supervise_interval=5, pool_options=None, acquire_timeout=60):
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.max_waiting = max_waiting if max_waiting is not None else size * pages_per_worker * 2
+        self.supervise_interval = supervise_interval
+        self.workers = []
+        for i in range(size):
+            launcher = ChromeLauncher(
+                binary,
+                worker_profile_dir(profile_dir, i),
+                port=port_base + i,
+                headless=headless,
+                startup_timeout=startup_timeout,
+            )
+            pool = CalendarPagePool(
+                launcher.cdp_url,
+                size=pages_per_worker,
+                ensure_browser=launcher.ensure_started,
+                **(pool_options or {}),
+            )
+            self.workers.append(ChromeWorker(i, launcher, pool))
+        self.profile_dir = profile_dir
+        self.waiting = 0
+        self.rejected = 0
+        self._affinity = OrderedDict()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._supervisor = None
+
+    @property
+    def capacity(self):
+        return sum(w.capacity for w in self.workers)
+
+    @property
+    def startup_seconds(self):
+        times = [w.launcher.startup_seconds for w in self.workers if w.launcher.startup_seconds is not None]
+        return max(times) if times else None
+
+    def seed_profiles(self):
+        for worker in self.workers[1:]:
+            seed_profile(self.profile_dir, worker.launcher.user_data_dir)
+
+    def launch_all(self):
+        """Start every Chrome in parallel; workers that fail stay down for the supervisor."""
+        self.seed_profiles()
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            futures = [(w, executor.submit(w.launcher.ensure_started)) for w in self.workers]
+        for worker, future in futures:
+            try:
+                future.result()
+            except BrowserLaunchError as e:
+                worker.healthy = False
+                tracing.warn("Chrome worker failed to start", worker=worker.index, error=str(e))
+
+    def start(self, warm=True):
+        """
+        Start supervising. With warm, every page pool opens its pages (and so
+        launches its Chrome) now; otherwise a pool starts on its first task.
+        """
+        self.seed_profiles()
+        if warm:
+            for worker in self.workers:
+                worker.pool.start()
+        if self._supervisor is None:
+            self._supervisor = threading.Thread(target=self._supervise, name="chrome-supervisor", daemon=True)
+            self._supervisor.start()
+        tracing.debug("Chrome worker pool started", workers=self.size, pages=self.capacity)
+
+    def is_ready(self):
+        return any(w.healthy and w.launcher.is_ready() for w in self.workers)
+
+    # ---------- scheduling ----------
+    def saturated(self):
+        with self._cond:
+            return self._all_busy() and self.waiting >= self.max_waiting
+
+    def _all_busy(self):
+        healthy = [w for w in self.workers if w.healthy]
+        # No healthy worker means no free page either
+        return not healthy or all(w.active >= w.capacity for w in healthy)
+
+    def _check_available(self):
+        # Called with self._cond held
+        if not any(w.healthy for w in self.workers):
+            raise WorkerPoolUnavailable(f"none of the {self.size} Chrome workers is running")
+
+    def _pick(self, affinity):
+        # Called with self._cond held
+        candidates = [w for w in self.workers if w.healthy and w.active < w.capacity]
+        if not candidates:
+            return None
+        if affinity is not None:
+            index = self._affinity.get(affinity)
+            if index is not None and self.workers[index] in candidates:
+                self._affinity.move_to_end(affinity)
+                return self.workers[index]
+        worker = min(candidates, key=lambda w: (w.load, w.active, w.index))
+        if affinity is not None:
+            self._affinity[affinity] = worker.index
+            self._affinity.move_to_end(affinity)
+            if len(self._affinity) > MAX_AFFINITY_KEYS:
+                self._affinity.popitem(last=False)
+        return worker
+
+    def _acquire(self, affinity, timeout):
+        deadline = time.monotonic() + (self.acquire_timeout if timeout is None else timeout)
+        with self._cond:
+            worker = self._pick(affinity)
+            if worker is None:
+                self._check_available()
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    WORKER_REJECTIONS.inc()
+                    raise WorkerPoolBusy(f"all {self.size} Chrome workers are busy")
+                self.waiting += 1
+                try:
+                    while worker is None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise WorkerPoolBusy("timed out waiting for a free Chrome worker")
+                        self._cond.wait(remaining)
+                        worker = self._pick(affinity)
+                        if worker is None:
+                            self._check_available()
+                finally:
+                    self.waiting -= 1
+            worker.active += 1
+            return worker
+
+    def _release(self, worker, seconds, ok):
+        with self._cond:
+            worker.active -= 1
+            worker.busy_seconds += seconds
+            if ok:
+                worker.completed += 1
+            else:
+                worker.failed += 1
+            self._cond.notify()
+
+    def run(self, func, *args, affinity=None, timeout=None, **kwargs):
+        worker = self._acquire(affinity, timeout)
+        started = time.monotonic()
+        ok = False
+        try:
+            result = worker.pool.run(func, *args, **kwargs)
+            ok = True
+            return result
+        finally:
+            self._release(worker, time.monotonic() - started, ok)
+
+    # ---------- supervision ----------
+    def _supervise(self):
+        while not self._stop.wait(self.supervise_interval):
+            for worker in self.workers:
+                if self._stop.is_set():
+                    return
+                self._check(worker)
+
+    def _check(self, worker):
+        process = worker.launcher.process
+        crashed = process is not None and process.poll() is not None
+        if not crashed and worker.healthy:
+            return
+        if crashed:
+            tracing.warn("Chrome worker exited, restarting", worker=worker.index, code=process.returncode)
+        try:
+            worker.launcher.ensure_started()
+        except BrowserLaunchError as e:
+            tracing.warn("Chrome worker restart failed", worker=worker.index, error=str(e))
+            with self._cond:
+                worker.healthy = False
+                # Waiters re-check whether any worker is left
+                self._cond.notify_all()
+            return
+        with self._cond:
+            if crashed:
+                worker.restarts += 1
+                WORKER_RESTARTS.inc(worker=str(worker.index))
+            worker.healthy = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": [w.stats() for w in self.workers],
+                "capacity": self.capacity,
+                "busy": sum(w.active for w in self.workers),
+                "waiting": self.waiting,
+                "rejected": self.rejected,
+            }
+
+    def close(self):
+        self._stop.set()
+        for worker in self.workers:
+            worker.pool.close()
+        for worker in self.workers:
+            worker.launcher.stop()
@@ -1,8 +1,41 @@
 const btn = document.getElementById("recordBtn");
 const result = document.getElementById("result");
+const jobStatus = document.getElementById("status");
+const suggestionsBox = document.getElementById("suggestions");
 
 const greeting = "您好，我是您的日程助手，你要记录什么日程？";
 
+const API_BASE = "http://127.0.0.1:8000";
+const WS_BASE = API_BASE.replace(/^http/, "ws");
+
+function newId() {
+  return window.crypto && crypto.randomUUID
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+}
+
+// 同一页面内的多次录音属于同一会话，冲突后的新时间会接回原来的任务
+const SESSION_ID = newId();
+
+const FINISHED = ["done", "failed", "cancelled"];
+
+let currentJobId = null;
+let promptedAt = null;
+let currentRecognition = null;
+let awaitingJobId = null;
+let speechStream = null;
+
+const STATUS_LABELS = {
+  queued: "排队中…",
+  parsed: "已解析，准备检查日程…",
+  checking_conflicts: "正在检查时间冲突…",
+  creating: "正在创建日程…",
+  awaiting_input: "时间冲突，请说出新的时间…",
+  done: "日程创建完成 ✅",
+  failed: "日程创建失败 ❌",
+  cancelled: "已取消"
+};
+
 console.log("[DEBUG] Script loaded");
 
 btn.onclick = () => {
@@ -31,9 +64,13 @@ function startRecognition() {
   console.log("[DEBUG] startRecognition()");
 
   const recognition = new webkitSpeechRecognition();
+  currentRecognition = recognition;
   recognition.lang = "zh-CN";
   recognition.continuous = false;
-  recognition.interimResults = false;
+  // Interim transcripts go to the backend while the user is still talking,
+  // so it can load the calendar day before the sentence is finished
+  recognition.interimResults = true;
+  openSpeechStream();
 
   recognition.start();
   console.log("[DEBUG] Speech recognition started");
@@ -41,10 +78,14 @@ function startRecognition() {
   recognition.onresult = async (e) => {
     console.log("[DEBUG] Recognition result event:", e);
 
+    const text = Array.from(e.results).map(r => r[0].transcript).join("");
+    if (!e.results[e.results.length - 1].isFinal) {
+      sendStream({ text });
+      return;
+    }
+
     recognition.stop();
     console.log("[DEBUG] Recognition stopped");
-
-    const text = e.results[0][0].transcript;
     console.log("[DEBUG] Recognized text:", text);
 
     result.innerText = "识别内容：" + text;
@@ -56,7 +97,7 @@ function startRecognition() {
     playBtn.innerText = "语音播放";
     playBtn.onclick = () => {
       console.log("[DEBUG] Play button clicked");
-      speakText(text);
+      synthesizeText(text);
     };
     result.appendChild(playBtn);
 
@@ -73,13 +114,22 @@ function startRecognition() {
 
     console.log("[DEBUG] Sending text to backend:", text);
 
+    // Retries of this utterance reuse the key, so the backend creates it once
+    const idempotencyKey = newId();
+    if (sendStream({ text, final: true, idempotency_key: idempotencyKey })) {
+      // The job id comes back on the stream (handleSpeechResponse)
+      return;
+    }
+
     try {
-      const resp = await fetch("http://127.0.0.1:8000/speech", {
+      const resp = await fetch(`${API_BASE}/speech`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ text })
+        body: JSON.stringify({ text, session_id: SESSION_ID, idempotency_key: idempotencyKey })
       });
       console.log("[DEBUG] Backend response status:", resp.status);
+
+      handleSpeechResponse(await resp.json());
     } catch (err) {
       console.error("[ERROR] Backend request failed:", err);
     }
@@ -92,20 +142,194 @@ function startRecognition() {
   };
 }
 
-function speakText(text) {
-  console.log("[DEBUG] speakText()", text);
+function openSpeechStream() {
+  if (speechStream && speechStream.readyState <= WebSocket.OPEN) {
+    return;
+  }
+  speechStream = new WebSocket(`${WS_BASE}/speech/stream?session_id=${encodeURIComponent(SESSION_ID)}`);
+  speechStream.onmessage = (e) => handleSpeechResponse(JSON.parse(e.data));
+  speechStream.onclose = () => {
+    console.log("[DEBUG] Speech stream closed");
+    speechStream = null;
+  };
+}
+
+function sendStream(message) {
+  // False when the stream is not open; the caller falls back to POST /speech
+  if (!speechStream || speechStream.readyState !== WebSocket.OPEN) {
+    return false;
+  }
+  speechStream.send(JSON.stringify(message));
+  return true;
+}
+
+function handleSpeechResponse(data) {
+  console.log("[DEBUG] Speech response", data.status, data.job_id || data.date || "");
+  if (data.status === "prefetching") {
+    return;
+  }
+  if (data.status === "failed") {
+    // The text could not be parsed into an event; no job was created
+    jobStatus.innerText = `${STATUS_LABELS.failed}（${data.error}）`;
+    btn.disabled = false;
+    return;
+  }
+  if (!data.job_id) {
+    jobStatus.innerText = "服务繁忙，请稍后再试";
+    btn.disabled = false;
+    return;
+  }
+  if (data.job_id !== currentJobId) {
+    // A resumed job is already being followed
+    followJob(data.job_id);
+  }
+}
+
+function showJobStatus(job) {
+  const label = STATUS_LABELS[job.status] || job.status;
+  jobStatus.innerText = job.error ? `${label}（${job.error}）` : label;
+}
+
+function showSuggestions(job) {
+  suggestionsBox.innerHTML = "";
+  (job.suggestions || []).forEach((slot, index) => {
+    const slotBtn = document.createElement("button");
+    slotBtn.innerText = `${slot.start_date} ${slot.start_time}-${slot.end_time}`;
+    slotBtn.onclick = () => acceptSuggestion(job.job_id, index);
+    suggestionsBox.appendChild(slotBtn);
+  });
+}
+
+async function acceptSuggestion(jobId, index) {
+  console.log("[DEBUG] acceptSuggestion()", jobId, index);
+  awaitingJobId = null;
+  if (currentRecognition) {
+    // The choice replaces the spoken answer
+    currentRecognition.abort();
+  }
+  suggestionsBox.innerHTML = "";
+  try {
+    const resp = await fetch(`${API_BASE}/jobs/${jobId}/accept`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ index })
+    });
+    console.log("[DEBUG] Accept response status:", resp.status);
+  } catch (err) {
+    console.error("[ERROR] Accept request failed:", err);
+  }
+}
+
+function handleJobUpdate(job) {
+  showJobStatus(job);
+  if (job.status !== "awaiting_input") {
+    awaitingJobId = null;
+    suggestionsBox.innerHTML = "";
+  }
+  if (job.status === "awaiting_input" && job.updated_at !== promptedAt) {
+    // Conflict: say why and offer free slots, then record the new time for the same job
+    promptedAt = job.updated_at;
+    awaitingJobId = job.job_id;
+    showSuggestions(job);
+    speakParts(job.prompt_parts || [{ text: job.prompt }], () => {
+      // Skip recording if a suggestion was picked while the prompt played
+      if (awaitingJobId === job.job_id) {
+        startRecognition();
+      }
+    });
+  }
+  if (FINISHED.includes(job.status)) {
+    btn.disabled = false;
+    return true;
+  }
+  return false;
+}
+
+function followJob(jobId) {
+  console.log("[DEBUG] followJob()", jobId);
+  currentJobId = jobId;
+  jobStatus.innerText = STATUS_LABELS.queued;
+
+  let finished = false;
+  const ws = new WebSocket(`${WS_BASE}/jobs/${jobId}/ws`);
+
+  ws.onmessage = (e) => {
+    const job = JSON.parse(e.data);
+    console.log("[DEBUG] Job update:", job.status);
+    finished = handleJobUpdate(job);
+  };
+
+  ws.onerror = () => {
+    console.log("[WARN] Job WebSocket failed, falling back to polling");
+  };
+
+  ws.onclose = () => {
+    if (!finished) {
+      pollJob(jobId);
+    }
+  };
+}
+
+async function pollJob(jobId) {
+  try {
+    const resp = await fetch(`${API_BASE}/jobs/${jobId}`);
+    const job = await resp.json();
+    if (handleJobUpdate(job)) {
+      return;
+    }
+  } catch (err) {
+    console.error("[ERROR] Job status request failed:", err);
+  }
+  setTimeout(() => pollJob(jobId), 1000);
+}
+
+function playCachedAudio(phrase) {
+  // Pre-rendered clip of a fixed prompt fragment from the backend phrase
+  // cache; the browser HTTP cache keeps it after the first play (ETag / Cache-Control).
+  return new Promise((resolve, reject) => {
+    const audio = new Audio(`${API_BASE}/audio/${encodeURIComponent(phrase)}`);
+    audio.onended = resolve;
+    audio.onerror = reject;
+    audio.play().catch(reject);
+  });
+}
+
+function speakParts(parts, onEnd) {
+  // Fixed fragments ({phrase, text}) play from the cache, dates and times ({text}) are synthesized
+  console.log("[DEBUG] speakParts()", parts.map(p => p.text).join(""));
+  if (parts.length === 0) {
+    if (onEnd) onEnd();
+    return;
+  }
+  const [part, ...rest] = parts;
+  const next = () => speakParts(rest, onEnd);
+  if (!part.phrase) {
+    synthesizeText(part.text, next);
+    return;
+  }
+  playCachedAudio(part.phrase).then(next, () => {
+    console.log("[DEBUG] Cached audio unavailable, using speechSynthesis");
+    synthesizeText(part.text, next);
+  });
+}
+
+function synthesizeText(text, onEnd) {
+  console.log("[DEBUG] synthesizeText()", text);
 
   const utterance = new SpeechSynthesisUtterance(text);
   utterance.lang = "zh-CN";
+  if (onEnd) {
+    utterance.onend = onEnd;
+  }
 
   function setVoice() {
     const voices = speechSynthesis.getVoices();
     const zhVoice = voices.find(v => v.lang.startsWith("zh"));
     if (zhVoice) {
       utterance.voice = zhVoice;
-      console.log("[DEBUG] speakText using voice:", zhVoice.name);
+      console.log("[DEBUG] synthesizeText using voice:", zhVoice.name);
     } else {
-      console.log("[WARN] speakText no zh voice found");
+      console.log("[WARN] synthesizeText no zh voice found");
     }
   }
 